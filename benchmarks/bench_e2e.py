@@ -0,0 +1,181 @@
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cms_server import CMSStandIn  # noqa: E402
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[p - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run main() against a local CMS stand-in and report throughput"
+    )
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=50, help="milliseconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--session-requests",
+        type=int,
+        help="expire each login session after this many requests",
+    )
+    parser.add_argument(
+        "--capacity",
+        type=int,
+        help="concurrent requests the stand-in serves before slowing down",
+    )
+    parser.add_argument(
+        "--max-page-size",
+        type=int,
+        help="largest student list page the stand-in will serve",
+    )
+    parser.add_argument(
+        "--slow-rate",
+        type=float,
+        default=0.0,
+        help="share of stand-in responses that are ten times slower",
+    )
+    parser.add_argument("--bulk-listing", nargs="?", const="ALL")
+    parser.add_argument("--speculative", action="store_true")
+    parser.add_argument("--hedge", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--per-host", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--parse-processes", type=int, default=0)
+    parser.add_argument("--adaptive", action="store_true")
+    parser.add_argument(
+        "--database-url",
+        help="database to write to (default: a fresh SQLite file)",
+    )
+    parser.add_argument("--metrics-out", help="write main()'s run metrics to a file")
+    parser.add_argument("--dashboard", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = CMSStandIn(
+        students=args.students,
+        latency=args.latency / 1000,
+        error_rate=args.error_rate,
+        session_requests=args.session_requests,
+        capacity=args.capacity,
+        max_page_size=args.max_page_size,
+        slow_rate=args.slow_rate,
+    )
+    server.start()
+
+    workdir = tempfile.mkdtemp(prefix="cms-bench-")
+    os.environ["CMS_BASE_URL"] = server.base_url
+    os.environ["CMS_DATABASE_URL"] = args.database_url or (
+        f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    )
+
+    from sqlalchemy import func, select
+
+    import main as scraper_main
+    import writer as student_writer
+    from browser import BASE_URL, Browser
+    from student import Session, Student
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    def stand_in_login(self):
+        self.session.get(f"{BASE_URL}/login.php?username=bench", timeout=10)
+
+    Browser._login = stand_in_login
+
+    lock = threading.Lock()
+    fetch_latencies = []
+    write_seconds = [0.0]
+    processed = [0]
+
+    browser = Browser()
+    transport_get = browser.transport.get
+
+    def timed_get(url, **kwargs):
+        started = time.perf_counter()
+        try:
+            return transport_get(url, **kwargs)
+        finally:
+            with lock:
+                fetch_latencies.append(time.perf_counter() - started)
+
+    browser.transport.get = timed_get
+
+    writer_write = student_writer.StudentWriter._write
+
+    def timed_write(self, rows):
+        started = time.perf_counter()
+        try:
+            return writer_write(self, rows)
+        finally:
+            with lock:
+                write_seconds[0] += time.perf_counter() - started
+
+    student_writer.StudentWriter._write = timed_write
+
+    process_student = scraper_main.process_student
+
+    def counted_process_student(*a, **kw):
+        outcome = process_student(*a, **kw)
+        with lock:
+            processed[0] += 1
+        return outcome
+
+    scraper_main.process_student = counted_process_student
+
+    started = time.perf_counter()
+    scraper_main.main(
+        workers=args.workers,
+        per_host=args.per_host,
+        batch_size=args.batch_size,
+        dashboard=args.dashboard,
+        metrics_out=args.metrics_out,
+        adaptive=args.adaptive,
+        bulk_listing=args.bulk_listing,
+        speculative=args.speculative,
+        hedge=args.hedge,
+        parse_processes=args.parse_processes,
+    )
+    wall = time.perf_counter() - started
+
+    session = Session()
+    saved = session.execute(select(func.count()).select_from(Student)).scalar()
+    session.close()
+    server.shutdown()
+
+    requests = sum(server.requests.values())
+    print(f"students listed      {args.students}")
+    print(f"students processed   {processed[0]}")
+    print(f"students saved       {saved}")
+    print(f"wall time            {wall:.2f}s")
+    print(f"students/sec         {processed[0] / wall:.1f}")
+    print(f"requests             {requests}")
+    print(f"requests/student     {requests / max(processed[0], 1):.2f}")
+    print(f"fetch p50            {percentile(fetch_latencies, 50) * 1000:.1f}ms")
+    print(f"fetch p95            {percentile(fetch_latencies, 95) * 1000:.1f}ms")
+    print(
+        f"db write rate        {saved / write_seconds[0] if write_seconds[0] else 0:.0f} rows/s"
+    )
+    print(f"logins               {server.logins}")
+    print(f"expired sessions     {server.expired}")
+    print(f"injected errors      {server.errors}")
+    if browser.transport.limiter is not None:
+        print(f"concurrency limit    {browser.transport.limiter.limit}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import os
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extract import (  # noqa: E402
+    parse_details,
+    parse_html,
+    parse_program_list,
+    parse_sponsor,
+    parse_student_list,
+    parse_transcript,
+)
+from pages import FIXTURE_DIR  # noqa: E402
+
+# BeautifulSoup versions of the WebScraper parsers, kept as the reference the
+# lxml extractors must agree with.
+
+
+def bs4_student_list(html):
+    soup = BeautifulSoup(html, "lxml")
+    table = soup.find("table", id="ewlistmain")
+    if not table:
+        return None, None
+    students = []
+    for row in table.find_all("tr", class_=["ewTableRow", "ewTableAltRow"]):
+        columns = row.find_all("td")
+        if len(columns) < 7:
+            continue
+        students.append(
+            {
+                "school": columns[1].text.strip(),
+                "student_number": columns[3].text.strip(),
+                "name": columns[4].text.strip(),
+                "student_status": columns[6].text.strip(),
+            }
+        )
+    next_page = soup.find("a", string="Next")
+    return students, next_page["href"] if next_page else None
+
+
+def bs4_transcript(html):
+    soup = BeautifulSoup(html, "lxml")
+    program_td = soup.find("td", string="Program:")
+    program = program_td.find_next("td").text.strip() if program_td else None
+    results_td = soup.find_all("td", string="Results:")
+    cgpa = (
+        results_td[-1].find_next("td").text.strip().split(":")[-1].strip()
+        if results_td
+        else None
+    )
+    semester_tds = soup.find_all("td", string="Semester:")
+    academic_year = (
+        int(semester_tds[-1].find_next("td").text.split(",")[1].split()[1])
+        if semester_tds
+        else None
+    )
+    return program, cgpa, academic_year
+
+
+def bs4_program_list(html):
+    soup = BeautifulSoup(html, "lxml")
+    for row in soup.find_all("tr", class_=["ewTableRow", "ewTableAltRow"]):
+        cells = row.find_all("td")
+        if len(cells) >= 6 and cells[4].text.strip() == "Active":
+            program = " ".join(cells[0].text.strip().split(" ")[1:]).strip()
+            return program, int(cells[1].text.strip().split("-")[0])
+    return None
+
+
+def bs4_details(html):
+    soup = BeautifulSoup(html, "lxml")
+    return tuple(
+        soup.find("td", string=label).find_next("td").text.strip()
+        for label in ("Nationality", "Sex", "Birthdate", "Birth Place")
+    )
+
+
+def bs4_sponsor(html):
+    soup = BeautifulSoup(html, "lxml")
+    row = soup.find("tr", class_=["ewTableRow", "ewTableAltRow"])
+    if not row:
+        return None
+    cells = row.find_all("td")
+    return cells[5].text.strip() if len(cells) >= 6 else ""
+
+
+CASES = [
+    ("student_list", "student_list.html", bs4_student_list, parse_student_list),
+    ("transcript", "transcript.html", bs4_transcript, parse_transcript),
+    ("program_list", "program_list.html", bs4_program_list, parse_program_list),
+    ("details", "personal_view.html", bs4_details, parse_details),
+    ("sponsor", "program_list.html", bs4_sponsor, parse_sponsor),
+]
+
+
+def best_of(func, html, number, repeat):
+    return min(timeit.repeat(lambda: func(html), number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the BeautifulSoup and lxml page parsers"
+    )
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="saved CMS pages")
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    mismatches = 0
+    print(f"{'parser':<14}{'bs4 ms':>10}{'lxml ms':>10}{'speedup':>10}")
+    for name, fixture, reference, extractor in CASES:
+        with open(os.path.join(args.fixtures, fixture), encoding="utf-8") as f:
+            html = f.read()
+
+        def lxml_parse(html, extractor=extractor):
+            return extractor(parse_html(html))
+
+        expected = reference(html)
+        actual = lxml_parse(html)
+        if expected != actual:
+            mismatches += 1
+            print(f"{name}: mismatch\n  bs4:  {expected!r}\n  lxml: {actual!r}")
+
+        bs4_time = best_of(reference, html, args.number, args.repeat)
+        lxml_time = best_of(lxml_parse, html, args.number, args.repeat)
+        print(
+            f"{name:<14}{bs4_time * 1000:>10.3f}{lxml_time * 1000:>10.3f}{bs4_time / lxml_time:>9.1f}x"
+        )
+
+    if mismatches:
+        sys.exit(f"{mismatches} parser(s) disagree with the BeautifulSoup reference")
+
+
+if __name__ == "__main__":
+    main()
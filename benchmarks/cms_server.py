@@ -0,0 +1,236 @@
+import argparse
+import random
+import secrets
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from pages import (
+    login_page,
+    make_student,
+    personal_view_page,
+    program_list_page,
+    student_list_page,
+    transcript_page,
+)
+
+FIRST_STUDENT_NUMBER = 901000000
+PAGE_SIZE = 20
+SESSION_COOKIE = "PHPSESSID"
+
+
+class CMSStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        students: int = 1000,
+        latency: float = 0.05,
+        jitter: float = 0.5,
+        error_rate: float = 0.0,
+        session_requests: int | None = None,
+        page_size: int = PAGE_SIZE,
+        capacity: int | None = None,
+        max_page_size: int | None = None,
+        slow_rate: float = 0.0,
+        slow_factor: float = 10.0,
+    ):
+        super().__init__(address, CMSRequestHandler)
+        self.students = [
+            make_student(FIRST_STUDENT_NUMBER + number) for number in range(students)
+        ]
+        self.by_number = {s["student_number"]: s for s in self.students}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.session_requests = session_requests
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        # Share of responses that take slow_factor times longer, for a long tail
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        # Page size chosen with recperpage, kept per session like PHPMaker
+        self.page_sizes: dict[str, int] = {}
+        # Requests served concurrently before latency grows with the load
+        self.capacity = capacity
+        self.active = 0
+        self.sessions: dict[str, int | None] = {}
+        self.requests = Counter()
+        self.logins = 0
+        self.expired = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/campus/registry"
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def delay(self):
+        if self.latency > 0:
+            latency = self.latency
+            if self.capacity:
+                latency *= max(1.0, self.active / self.capacity)
+            if random.random() < self.slow_rate:
+                latency *= self.slow_factor
+            spread = latency * self.jitter
+            low, high = latency - spread, latency + spread
+            time.sleep(max(0.0, random.uniform(low, high)))
+
+    def login(self) -> str:
+        token = secrets.token_hex(8)
+        with self.lock:
+            self.sessions[token] = self.session_requests
+            self.logins += 1
+        return token
+
+    def use_session(self, token: str | None) -> bool:
+        with self.lock:
+            if token not in self.sessions:
+                return False
+            remaining = self.sessions[token]
+            if remaining is None:
+                return True
+            if remaining <= 0:
+                del self.sessions[token]
+                self.expired += 1
+                return False
+            self.sessions[token] = remaining - 1
+            return True
+
+
+class CMSRequestHandler(BaseHTTPRequestHandler):
+    server: CMSStandIn
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        page = url.path.rsplit("/", 1)[-1]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        server = self.server
+        with server.lock:
+            server.requests[page] += 1
+            server.active += 1
+        try:
+            server.delay()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+        if page == "login.php":
+            if "username" in query:
+                token = server.login()
+                self.send_html(
+                    student_list_page([], 1, 0),
+                    cookie=f"{SESSION_COOKIE}={token}; path=/",
+                )
+            else:
+                self.send_html(login_page())
+            return
+
+        if random.random() < server.error_rate:
+            with server.lock:
+                server.errors += 1
+            self.send_html("<html><body>Service Unavailable</body></html>", 503)
+            return
+
+        if not server.use_session(self.session_token()):
+            self.send_html(login_page())
+            return
+
+        if page == "r_studentviewlist.php":
+            self.send_html(self.student_list(query))
+            return
+
+        student = server.by_number.get(query.get("StudentID", ""))
+        if student is None:
+            self.send_html("<html><body>Not Found</body></html>", 404)
+        elif page == "Officialreport.php":
+            self.send_html(transcript_page(student))
+        elif page == "r_stdprogramlist.php":
+            self.send_html(program_list_page(student))
+        elif page == "r_stdpersonalview.php":
+            self.send_html(personal_view_page(student))
+        else:
+            self.send_html("<html><body>Not Found</body></html>", 404)
+
+    def student_list(self, query: dict) -> str:
+        server = self.server
+        students = server.students
+        token = self.session_token()
+        page_size = server.page_sizes.get(token, server.page_size)
+        start = max(int(query.get("start", "1")), 1)
+        recperpage = query.get("recperpage", "")
+        if recperpage.upper() == "ALL" or recperpage.isdigit():
+            page_size = (
+                len(students) if recperpage.upper() == "ALL" else int(recperpage)
+            )
+            if server.max_page_size:
+                page_size = min(page_size, server.max_page_size)
+            page_size = max(page_size, 1)
+            with server.lock:
+                server.page_sizes[token] = page_size
+            start = 1
+        rows = students[start - 1 : start - 1 + page_size]
+        return student_list_page(rows, start, len(students))
+
+    def session_token(self) -> str | None:
+        for cookie in self.headers.get("Cookie", "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == SESSION_COOKIE:
+                return value
+        return None
+
+    def send_html(self, html: str, status: int = 200, cookie: str | None = None):
+        body = html.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic CMS registry")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=50, help="milliseconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--session-requests", type=int)
+    parser.add_argument("--capacity", type=int)
+    parser.add_argument("--max-page-size", type=int)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = CMSStandIn(
+        ("127.0.0.1", args.port),
+        students=args.students,
+        latency=args.latency / 1000,
+        error_rate=args.error_rate,
+        session_requests=args.session_requests,
+        capacity=args.capacity,
+        max_page_size=args.max_page_size,
+        slow_rate=args.slow_rate,
+    )
+    print(f"Serving {args.students} students at {server.base_url}")
+    print(f"Log in with {server.base_url}/login.php?username=bench")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
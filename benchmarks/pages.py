@@ -0,0 +1,213 @@
+import os
+import random
+import sys
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+SCHOOLS = ["FAID", "FBS", "FCM", "FCTH", "FDSI", "FFLD", "FFTB", "FINT", "FMS"]
+PROGRAMS = [
+    "BSc in Information Technology",
+    "Diploma in Business Management",
+    "Associate Degree in Graphic Design",
+    "Certificate in Tourism Management",
+    "BA in Broadcasting and Journalism",
+    "Diploma in Architectural Technology",
+]
+FIRST_NAMES = ["Thabo", "Lerato", "Palesa", "Teboho", "Mpho", "Nthabiseng", "Kabelo"]
+SURNAMES = ["Mokoena", "Mohapi", "Letsie", "Ramakau", "Molapo", "Sekhesa", "Nkuebe"]
+SPONSORS = ["NMDS", "Self", "NMDS", "Private", "NMDS"]
+
+
+def layout(title: str, body: str) -> str:
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8">
+<title>{title}</title>
+<link href="registry.css" rel="stylesheet" type="text/css">
+</head>
+<body>
+<table width="100%" border="0" cellspacing="0" cellpadding="2">
+<tr><td class="ewHeaderRow">Limkokwing University - Registry</td>
+<td align="right"><a href="logout.php">[ Logout ]</a></td></tr>
+</table>
+<table width="100%" border="0" cellspacing="0" cellpadding="0">
+<tr><td class="ewMenuColumn" valign="top">
+<a href="r_studentviewlist.php">Students</a><br>
+<a href="r_stdprogramlist.php">Programs</a><br>
+<a href="Officialreport.php">Official Report</a>
+</td>
+<td class="ewContentColumn" valign="top">
+{body}
+</td></tr>
+</table>
+<table width="100%"><tr><td class="ewFooterRow">&nbsp;&copy;Registry 2024</td></tr></table>
+</body>
+</html>
+"""
+
+
+def login_page() -> str:
+    return """<!DOCTYPE html>
+<html>
+<head><title>Login</title></head>
+<body>
+<form name="login" id="login" action="login.php" method="post">
+<input type="hidden" name="token" value="0">
+<table>
+<tr><td>User Name</td><td><input type="text" name="username"></td></tr>
+<tr><td>Password</td><td><input type="password" name="userpassword"></td></tr>
+</table>
+<input type="submit" name="submit" value="Login">
+</form>
+</body>
+</html>
+"""
+
+
+def make_student(student_number: int) -> dict:
+    rng = random.Random(student_number)
+    program = rng.choice(PROGRAMS)
+    return {
+        "student_number": str(student_number),
+        "school": rng.choice(SCHOOLS),
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}",
+        "student_status": rng.choice(["Active", "Active", "Active", "Deferred"]),
+        "program": program,
+        "year_of_study": rng.randint(1, 4),
+        "semesters": rng.randint(1, 8),
+        "cgpa": f"{rng.uniform(1.5, 4.0):.2f}",
+        "nationality": rng.choice(["Mosotho", "Mosotho", "South African"]),
+        "sex": rng.choice(["Male", "Female"]),
+        "birthdate": f"{rng.randint(1995, 2006)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "birth_place": rng.choice(["Maseru", "Leribe", "Mafeteng", "Berea"]),
+        "sponsor": rng.choice(SPONSORS),
+        "has_transcript": rng.random() > 0.1,
+    }
+
+
+def student_list_page(students: list[dict], start: int, total: int) -> str:
+    rows = []
+    for index, student in enumerate(students):
+        row_class = "ewTableRow" if index % 2 == 0 else "ewTableAltRow"
+        rows.append(
+            f"""<tr class="{row_class}">
+<td><a href="r_stdpersonalview.php?StudentID={student['student_number']}">View</a></td>
+<td>{student['school']}</td>
+<td>{student['program']}</td>
+<td>{student['student_number']}</td>
+<td>{student['name']}</td>
+<td>0{student['student_number']}</td>
+<td>{student['student_status']}</td>
+<td>2022-08</td>
+</tr>"""
+        )
+
+    end = start + len(students) - 1
+    pager = f'<a href="r_studentviewlist.php?start=1">First</a>&nbsp;'
+    if start > 1:
+        pager += f'<a href="r_studentviewlist.php?start={max(start - len(students), 1)}">Prev</a>&nbsp;'
+    if end < total:
+        pager += f'<a href="r_studentviewlist.php?start={end + 1}">Next</a>&nbsp;'
+
+    body = f"""<p><span class="ewTitle">Student View</span></p>
+<form name="ewpagerform" id="ewpagerform" action="r_studentviewlist.php" method="get">
+<table class="ewPager"><tr><td>{pager}</td>
+<td>Records {start} to {end} of {total}</td></tr></table>
+</form>
+<table id="ewlistmain" class="ewTable">
+<tr class="ewTableHeader">
+<td>&nbsp;</td><td>School</td><td>Program</td><td>Student No</td>
+<td>Name</td><td>IC/Passport</td><td>Status</td><td>Latest Term</td>
+</tr>
+{"".join(rows)}
+</table>"""
+    return layout("Student View", body)
+
+
+def transcript_page(student: dict) -> str:
+    if not student["has_transcript"]:
+        return layout("Official Report", "<p>No records found</p>")
+
+    semesters = []
+    for number in range(1, student["semesters"] + 1):
+        year = (number + 1) // 2
+        semesters.append(
+            f"""<table class="ewTable">
+<tr><td>Semester:</td><td>{2020 + year}-{"08" if number % 2 else "02"}, Year {year} Sem {2 - number % 2}</td></tr>
+<tr class="ewTableHeader"><td>Code</td><td>Module</td><td>Credits</td><td>Grade</td></tr>
+<tr class="ewTableRow"><td>MOD{number}01</td><td>Module A</td><td>3</td><td>B+</td></tr>
+<tr class="ewTableAltRow"><td>MOD{number}02</td><td>Module B</td><td>3</td><td>A-</td></tr>
+<tr class="ewTableRow"><td>MOD{number}03</td><td>Module C</td><td>4</td><td>B</td></tr>
+<tr><td>Results:</td><td>GPA: 3.00 ; CGPA: {student['cgpa']}</td></tr>
+</table>"""
+        )
+
+    body = f"""<p><span class="ewTitle">Official Report</span></p>
+<table class="ewTable">
+<tr><td>Student No:</td><td>{student['student_number']}</td></tr>
+<tr><td>Name:</td><td>{student['name']}</td></tr>
+<tr><td>Program:</td><td>{student['program']}</td></tr>
+</table>
+{"".join(semesters)}"""
+    return layout("Official Report", body)
+
+
+def program_list_page(student: dict) -> str:
+    body = f"""<p><span class="ewTitle">Student Programs</span></p>
+<table id="ewlistmain" class="ewTable">
+<tr class="ewTableHeader">
+<td>Program</td><td>Intake</td><td>Start</td><td>Graduation</td><td>Status</td><td>Asst-Provider</td>
+</tr>
+<tr class="ewTableRow">
+<td>P{student['school']} {student['program']}</td><td>{2024 - student['year_of_study']}-08</td>
+<td>2022-08-01</td><td></td><td>Active</td><td>{student['sponsor']}</td>
+</tr>
+<tr class="ewTableAltRow">
+<td>PFOUND Foundation Programme</td><td>2019-08</td>
+<td>2019-08-01</td><td>2020-06-30</td><td>Completed</td><td>Self</td>
+</tr>
+</table>"""
+    return layout("Student Programs", body)
+
+
+def personal_view_page(student: dict) -> str:
+    fields = [
+        ("Student No", student["student_number"]),
+        ("Name", student["name"]),
+        ("Nationality", student["nationality"]),
+        ("Sex", student["sex"]),
+        ("Birthdate", student["birthdate"]),
+        ("Birth Place", student["birth_place"]),
+        ("Religion", "Christian"),
+        ("Race", "African"),
+        ("Marital Status", "Single"),
+    ]
+    rows = "".join(
+        f'<tr><td class="ewTableHeader">{label}</td><td class="ewTableAltRow">{value}</td></tr>\n'
+        for label, value in fields
+    )
+    body = f"""<p><span class="ewTitle">Student Personal View</span></p>
+<table class="ewTable">
+{rows}</table>"""
+    return layout("Student Personal View", body)
+
+
+def write_fixtures(directory: str = FIXTURE_DIR, page_size: int = 50):
+    os.makedirs(directory, exist_ok=True)
+    students = [make_student(901000000 + number) for number in range(page_size)]
+    student = next(s for s in students if s["has_transcript"])
+    pages = {
+        "student_list.html": student_list_page(students, 1, page_size * 40),
+        "transcript.html": transcript_page(student),
+        "program_list.html": program_list_page(student),
+        "personal_view.html": personal_view_page(student),
+    }
+    for name, html in pages.items():
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(html)
+        print(f"Wrote {os.path.join(directory, name)}")
+
+
+if __name__ == "__main__":
+    write_fixtures(sys.argv[1] if len(sys.argv) > 1 else FIXTURE_DIR)
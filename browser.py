@@ -1,27 +1,63 @@
+import json
 import logging
-from urllib.parse import quote_plus
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING
+from urllib.parse import quote_plus, urlparse
 
 import requests
 import urllib3
-from bs4 import BeautifulSoup, Tag
 from requests import Response
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions
-from selenium.webdriver.support.wait import WebDriverWait
 from urllib3.exceptions import InsecureRequestWarning
 
+import profiling
+from cache import CacheMiss, ResponseCache
+from metrics import metrics
+from transport import (
+    MAX_RETRIES,
+    REQUEST_TIMEOUT,
+    AdaptiveLimiter,
+    LatencyWindow,
+    RetryBudget,
+    TokenBucket,
+    Transport,
+    build_session,
+    mount_adapters,
+)
+
+if TYPE_CHECKING:
+    from bs4 import Tag
+
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
-BASE_URL = "https://cmslesothosandbox.limkokwing.net/campus/registry"
+BASE_URL = os.environ.get(
+    "CMS_BASE_URL", "https://cmslesothosandbox.limkokwing.net/campus/registry"
+)
+MAX_REQUESTS_PER_HOST = 8
+RECENT_RESPONSE_TTL = 30
+RECENT_RESPONSE_LIMIT = 64
+# A personal view without a StudentID is a small page whatever the session
+# holds, unlike the student list whose page size --bulk-listing raises
+SESSION_CHECK_URL = f"{BASE_URL}/r_stdpersonalview.php"
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.01
+HEDGE_RATIO = 0.05
+# Pages whose content depends on filters and paging held in the CMS session.
+# They are still cached for --replay but always fetched live otherwise.
+SESSION_PAGES = ("r_studentviewlist.php",)
 
 urllib3.disable_warnings(InsecureRequestWarning)
 
 
-def get_form_payload(form: Tag):
+def get_form_payload(form: "Tag"):
     data = {}
     inputs = form.select("input")
     for tag in inputs:
@@ -30,11 +66,22 @@ def get_form_payload(form: Tag):
     return data
 
 
-def check_logged_in(html: str) -> bool:
-    page = BeautifulSoup(html, "lxml")
-    form = page.select_one("form")
+FORM_TAG = re.compile(rb"<form\b[^>]*>", re.IGNORECASE)
+LOGIN_ACTION = re.compile(
+    rb"""\saction\s*=\s*(["']?)login\.php\1[\s/>]""", re.IGNORECASE
+)
+
+
+def session_dependent(url: str) -> bool:
+    return os.path.basename(urlparse(url).path) in SESSION_PAGES
+
+
+def check_logged_in(html: str | bytes) -> bool:
+    if isinstance(html, str):
+        html = html.encode()
+    form = FORM_TAG.search(html)
     if form:
-        if form.attrs.get("action") == "login.php":
+        if LOGIN_ACTION.search(form.group(0)):
             return False
     return True
 
@@ -43,15 +90,217 @@ class Browser:
     _instance = None
     logged_in = False
     session: requests.Session | None = None
+    transport: Transport | None = None
+    host_limit = MAX_REQUESTS_PER_HOST
+    cache: ResponseCache | None = None
+    replay = False
+    read_cache = True
+    cookie_jar: str | None = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Browser, cls).__new__(cls)
-            cls._instance.session = requests.Session()
-            cls._instance.session.verify = False
+            cls._instance.session = build_session(MAX_REQUESTS_PER_HOST)
+            cls._instance.transport = Transport(cls._instance.session)
+            cls._instance._host_slots = {}
+            cls._instance._host_slots_lock = threading.Lock()
+            cls._instance._inflight = {}
+            cls._instance._recent = OrderedDict()
+            cls._instance._coalesce_lock = threading.Lock()
+            cls._instance._login_lock = threading.RLock()
+            cls._instance._login_generation = 0
+            cls._instance._jar_mtime = None
+            cls._instance._keep_alive_stop = threading.Event()
+            cls._instance._keep_alive_thread = None
+            cls._instance._hedge_pool = None
+            cls._instance._hedge_budget = None
+            cls._instance._latencies = LatencyWindow()
         return cls._instance
 
+    def set_host_limit(self, limit: int):
+        if limit < 1:
+            raise ValueError("Host limit must be at least 1")
+        with self._host_slots_lock:
+            self.host_limit = limit
+            self._host_slots.clear()
+        mount_adapters(self.session, limit)
+
+    def configure_transport(
+        self,
+        rate: float | None = None,
+        max_retries: int = MAX_RETRIES,
+        adaptive: bool = False,
+    ):
+        self.transport.rate_limit = TokenBucket(rate) if rate else None
+        self.transport.max_retries = max_retries
+        self.transport.limiter = (
+            AdaptiveLimiter(maximum=self.host_limit) if adaptive else None
+        )
+
+    def use_cache(
+        self,
+        cache: ResponseCache | None,
+        replay: bool = False,
+        read_cache: bool = True,
+    ):
+        if replay and cache is None:
+            raise ValueError("Replay mode requires a response cache")
+        self.cache = cache
+        self.replay = replay
+        self.read_cache = read_cache
+
+    def _cached(self, url: str) -> bool:
+        if self.replay:
+            return True
+        return self.read_cache and not session_dependent(url)
+
+    def enable_hedging(self, enabled: bool = True):
+        # Both the original and the hedged request run in the pool so the caller
+        # can return as soon as either one finishes
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        self._hedge_pool = None
+        if enabled:
+            self._hedge_pool = ThreadPoolExecutor(
+                max_workers=4 * self.host_limit, thread_name_prefix="hedge"
+            )
+            self._hedge_budget = RetryBudget(ratio=HEDGE_RATIO)
+
+    def use_cookie_jar(self, path: str | None):
+        self.cookie_jar = path
+        self._jar_mtime = None
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.host_limit)
+                self._host_slots[host] = slot
+            return slot
+
     def login(self):
+        if self.replay:
+            logger.info("Replay mode, skipping login")
+            return
+        with self._login_lock:
+            if not self._restore_cookies():
+                self._login()
+                self._save_cookies()
+            self._login_generation += 1
+
+    def _relogin(self, generation: int):
+        with self._login_lock:
+            if self._login_generation != generation:
+                logger.info("Session was renewed by another request")
+                return
+            logger.info("Session expired, logging in again")
+            metrics.increment("relogins")
+            self.login()
+
+    def _jar_changed(self) -> bool:
+        try:
+            return os.path.getmtime(self.cookie_jar) != self._jar_mtime
+        except OSError:
+            return False
+
+    def _save_cookies(self):
+        if self.cookie_jar is None:
+            return
+        cookies = [
+            dict(
+                name=cookie.name,
+                value=cookie.value,
+                domain=cookie.domain,
+                path=cookie.path,
+                expires=cookie.expires,
+                secure=cookie.secure,
+            )
+            for cookie in self.session.cookies
+        ]
+        temporary = f"{self.cookie_jar}.tmp"
+        descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(descriptor, "w") as f:
+            json.dump(cookies, f)
+        os.replace(temporary, self.cookie_jar)
+        self._jar_mtime = os.path.getmtime(self.cookie_jar)
+        logger.info(f"Saved {len(cookies)} session cookies to {self.cookie_jar}")
+
+    def _restore_cookies(self) -> bool:
+        # Only reuse the jar when it was written since we last used it: by a
+        # previous run at startup, or by another process sharing it later
+        if self.cookie_jar is None or not self._jar_changed():
+            return False
+        self._jar_mtime = os.path.getmtime(self.cookie_jar)
+        try:
+            with open(self.cookie_jar) as f:
+                cookies = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read cookie jar {self.cookie_jar}: {str(e)}")
+            return False
+
+        now = time.time()
+        self.session.cookies.clear()
+        for cookie in cookies:
+            if cookie["expires"] is not None and cookie["expires"] < now:
+                continue
+            self.session.cookies.set(**cookie)
+        if self._session_valid():
+            logger.info(f"Reusing session cookies from {self.cookie_jar}")
+            metrics.increment("cookie_jar_logins")
+            return True
+        logger.info("Saved session cookies have expired")
+        self.session.cookies.clear()
+        return False
+
+    def _session_valid(self) -> bool:
+        try:
+            # Redirects are not followed, so a bounce elsewhere never loads
+            # another page
+            response = self.transport.get(
+                SESSION_CHECK_URL, timeout=REQUEST_TIMEOUT, allow_redirects=False
+            )
+        except requests.RequestException as e:
+            logger.warning(f"Could not check the session: {str(e)}")
+            return False
+        if response.is_redirect:
+            location = urlparse(response.headers["Location"]).path
+            return os.path.basename(location) != "login.php"
+        return response.status_code < 500 and check_logged_in(response.content)
+
+    def start_keep_alive(self, interval: float):
+        if self.replay or self._keep_alive_thread is not None:
+            return
+        self._keep_alive_stop.clear()
+        self._keep_alive_thread = threading.Thread(
+            target=self._keep_alive, args=(interval,), name="keep-alive", daemon=True
+        )
+        self._keep_alive_thread.start()
+
+    def stop_keep_alive(self):
+        if self._keep_alive_thread is None:
+            return
+        self._keep_alive_stop.set()
+        self._keep_alive_thread.join()
+        self._keep_alive_thread = None
+
+    def _keep_alive(self, interval: float):
+        while not self._keep_alive_stop.wait(interval):
+            generation = self._login_generation
+            if self._session_valid():
+                continue
+            metrics.increment("keep_alive_renewals")
+            try:
+                self._relogin(generation)
+            except Exception as e:
+                logger.error(f"Keep-alive could not renew the session: {str(e)}")
+
+    def _login(self):
+        from selenium import webdriver
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions
+        from selenium.webdriver.support.wait import WebDriverWait
+
         logger.info("Logging in...")
         driver = webdriver.Firefox()
         url = f"{BASE_URL}/login.php"
@@ -76,17 +325,157 @@ class Browser:
                 cookie["name"], cookie["value"], domain=cookie["domain"]
             )
 
+    def _recent_response(self, url: str) -> Response | None:
+        entry = self._recent.get(url)
+        if entry is None:
+            return None
+        fetched_at, response = entry
+        if time.monotonic() - fetched_at > RECENT_RESPONSE_TTL:
+            del self._recent[url]
+            return None
+        self._recent.move_to_end(url)
+        return response
+
+    def _remember(self, url: str, response: Response):
+        self._recent[url] = (time.monotonic(), response)
+        self._recent.move_to_end(url)
+        while len(self._recent) > RECENT_RESPONSE_LIMIT:
+            self._recent.popitem(last=False)
+
     def fetch(self, url: str) -> Response:
+        with self._coalesce_lock:
+            response = self._recent_response(url)
+            if response is not None:
+                logger.info(f"Reusing recent response for {url}")
+                metrics.increment("coalesced_fetches")
+                return response
+            pending = self._inflight.get(url)
+            owner = pending is None
+            if owner:
+                pending = Future()
+                self._inflight[url] = pending
+
+        if not owner:
+            logger.info(f"Waiting for in-flight fetch of {url}")
+            metrics.increment("coalesced_fetches")
+            return pending.result()
+
+        try:
+            response = self._fetch(url)
+        except Exception as e:
+            with self._coalesce_lock:
+                del self._inflight[url]
+            pending.set_exception(e)
+            raise
+
+        with self._coalesce_lock:
+            del self._inflight[url]
+            if response.status_code == 200:
+                self._remember(url, response)
+        pending.set_result(response)
+        return response
+
+    def _hedge_delay(self) -> float | None:
+        if len(self._latencies.recent(HEDGE_MIN_SAMPLES)) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(self._latencies.percentile(HEDGE_PERCENTILE), HEDGE_MIN_DELAY)
+
+    def _get(self, url: str) -> Response:
+        pool = self._hedge_pool
+        delay = self._hedge_delay() if pool is not None else None
+        if delay is None:
+            return self._get_once(url)
+
+        self._hedge_budget.deposit()
+        sent = threading.Event()
+        primary = pool.submit(self._get_once, url, sent)
+        primary.add_done_callback(lambda _: sent.set())
+        # The p95 only covers time on the wire, so the delay starts once the
+        # primary holds a host slot rather than while it queues for one
+        sent.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        # A hedge that has to queue for a slot behind the primary cannot win
+        slot = self._host_slot(url)
+        if not slot.acquire(blocking=False):
+            return primary.result()
+        if not self._hedge_budget.withdraw():
+            slot.release()
+            return primary.result()
+
+        logger.info(f"Hedging {url} after {delay * 1000:.0f}ms")
+        metrics.increment("hedged_fetches")
+        hedge = pool.submit(self._request, url)
+        hedge.add_done_callback(lambda _: slot.release())
+        pending = {primary, hedge}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((f for f in done if f.exception() is None), None)
+            if winner is None and pending:
+                continue
+            for loser in pending:
+                loser.cancel()
+            winner = winner or done.pop()
+            if winner is hedge:
+                metrics.increment("hedge_wins")
+            return winner.result()
+
+    def _get_once(self, url: str, sent: threading.Event | None = None) -> Response:
+        with self._host_slot(url):
+            if sent is not None:
+                sent.set()
+            return self._request(url)
+
+    def _request(self, url: str) -> Response:
+        with profiling.stage("fetch"):
+            started = time.perf_counter()
+            try:
+                response = self.transport.get(url, timeout=REQUEST_TIMEOUT)
+            except Exception as e:
+                metrics.observe(
+                    "fetch", time.perf_counter() - started, failure=type(e).__name__
+                )
+                raise
+        elapsed = time.perf_counter() - started
+        self._latencies.add(elapsed, response.status_code != 200)
+        metrics.observe(
+            "fetch",
+            elapsed,
+            size=len(response.content),
+            failure=(
+                None
+                if response.status_code == 200
+                else f"status_{response.status_code}"
+            ),
+        )
+        return response
+
+    def _fetch(self, url: str) -> Response:
+        if self.cache is not None and self._cached(url):
+            response = self.cache.get(url, ignore_ttl=self.replay)
+            if response is not None:
+                logger.info(f"Serving {url} from cache")
+                metrics.increment("cache_hits")
+                return response
+            if self.replay:
+                raise CacheMiss(f"{url} is not in the response cache")
+
         if self.session is None:
             raise ValueError("Session is not initialized")
         logger.info(f"Fetching {url}")
-        response = self.session.get(url, timeout=60)
-        is_logged_in = check_logged_in(response.text)
+        generation = self._login_generation
+        response = self._get(url)
+        is_logged_in = check_logged_in(response.content)
         if not is_logged_in:
-            logger.info("Session expired, logging in again")
-            self.login()
+            metrics.increment("login_page_bounces")
+            if self.transport.limiter is not None:
+                self.transport.limiter.congestion("login page bounce")
+            self._relogin(generation)
             logger.info(f"Logged in, re-fetching {url}")
-            response = self.session.get(url)
+            response = self._get(url)
         if response.status_code != 200:
             logger.warning(f"Unexpected status code: {response.status_code}")
+        elif self.cache is not None:
+            self.cache.put(url, response)
         return response
@@ -0,0 +1,110 @@
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+
+from requests import Response
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMiss(LookupError):
+    pass
+
+
+class ResponseCache:
+    def __init__(
+        self, path: str, ttl: float | None = None, max_bytes: int | None = None
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status_code INTEGER NOT NULL,
+                encoding TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+        self._db.commit()
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, url: str, ignore_ttl: bool = False) -> Response | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status_code, encoding, body, stored_at FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            status_code, encoding, body, stored_at = row
+            if not ignore_ttl and self.ttl is not None and now - stored_at > self.ttl:
+                return None
+            self._db.execute(
+                "UPDATE responses SET accessed_at = ? WHERE url = ?", (now, url)
+            )
+            self._db.commit()
+
+        response = Response()
+        response.status_code = status_code
+        response.encoding = encoding
+        response.url = url
+        response._content = zlib.decompress(body)
+        return response
+
+    def put(self, url: str, response: Response):
+        body = zlib.compress(response.content)
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute(
+                "SELECT size FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    response.status_code,
+                    response.encoding,
+                    body,
+                    len(body),
+                    now,
+                    now,
+                ),
+            )
+            self._size += len(body) - (previous[0] if previous else 0)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        while self._size > self.max_bytes:
+            row = self._db.execute(
+                "SELECT url, size FROM responses ORDER BY accessed_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self._size = 0
+                return
+            url, size = row
+            self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._size -= size
+            logger.debug(f"Evicted {url} from response cache")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,205 @@
+import argparse
+import time
+from collections import defaultdict
+
+from sqlalchemy import String, cast, delete, func, literal, select
+
+from student import Session, Student, StudentSummary, dialect_insert
+
+UNKNOWN = "Unknown"
+TOTAL = "total"
+ALL = "All"
+
+# Breakdowns kept in student_summary, by dimension name
+DIMENSIONS = {
+    TOTAL: None,
+    "faculty_or_school": Student.faculty_or_school,
+    "program": Student.program,
+    "gender": Student.gender,
+    "nationality": Student.nationality,
+    "year_of_study": Student.year_of_study,
+    "student_status": Student.student_status,
+    "graduate_status": Student.graduate_status,
+    "type_of_main_sponsor": Student.type_of_main_sponsor,
+}
+
+# Fees charged to a student, counting actual rather than recommended amounts
+FEE_COLUMNS = [
+    Student.fees_application,
+    Student.fees_registration,
+    Student.fees_tuition,
+    Student.fee_books,
+    Student.fee_accommodation_actual,
+    Student.fee_meals_actual,
+    Student.fee_lumpsum_actual,
+    Student.other_fees1_value,
+    Student.other_fees2_value,
+]
+SUMMARY_COLUMNS = [
+    "academic_year",
+    "dimension",
+    "value",
+    "headcount",
+    "fees_tuition",
+    "fees_total",
+]
+
+
+def rebuild(session) -> int:
+    year = func.coalesce(Student.academic_year, UNKNOWN)
+    fees_tuition = func.coalesce(func.sum(func.coalesce(Student.fees_tuition, 0)), 0)
+    fees_total = func.coalesce(
+        func.sum(sum(func.coalesce(column, 0) for column in FEE_COLUMNS)), 0
+    )
+
+    session.execute(delete(StudentSummary))
+    for dimension, column in DIMENSIONS.items():
+        if column is None:
+            value, groups = literal(ALL), [year]
+        else:
+            value = func.coalesce(cast(column, String), UNKNOWN)
+            groups = [year, value]
+        session.execute(
+            StudentSummary.__table__.insert().from_select(
+                SUMMARY_COLUMNS,
+                select(
+                    year,
+                    literal(dimension),
+                    value,
+                    func.count(),
+                    fees_tuition,
+                    fees_total,
+                ).group_by(*groups),
+            )
+        )
+    session.commit()
+    return session.execute(select(func.count()).select_from(StudentSummary)).scalar()
+
+
+def ensure_built(session):
+    if session.execute(select(StudentSummary.value).limit(1)).first() is None:
+        if session.execute(select(Student.student_number).limit(1)).first():
+            rebuild(session)
+
+
+def column_value(row: dict, column):
+    if column.key in row:
+        return row[column.key]
+    default = column.default
+    return default.arg if default is not None and not callable(default.arg) else None
+
+
+def deltas(rows: list[dict]) -> list[dict]:
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    for row in rows:
+        year = column_value(row, Student.academic_year) or UNKNOWN
+        fees_tuition = column_value(row, Student.fees_tuition) or 0
+        fees_total = sum(column_value(row, column) or 0 for column in FEE_COLUMNS)
+        for dimension, column in DIMENSIONS.items():
+            if column is None:
+                value = ALL
+            else:
+                value = column_value(row, column)
+                value = UNKNOWN if value is None else str(value)
+            entry = totals[(year, dimension, value)]
+            entry[0] += 1
+            entry[1] += fees_tuition
+            entry[2] += fees_total
+    # Sorted so concurrent writers lock summary rows in the same order
+    return [
+        dict(zip(SUMMARY_COLUMNS, (*key, *entry)))
+        for key, entry in sorted(totals.items())
+    ]
+
+
+def apply_deltas(session, rows: list[dict]):
+    if not rows:
+        return
+    statement = dialect_insert(StudentSummary)
+    statement = statement.on_conflict_do_update(
+        index_elements=[
+            StudentSummary.academic_year,
+            StudentSummary.dimension,
+            StudentSummary.value,
+        ],
+        set_={
+            column: getattr(StudentSummary, column) + statement.excluded[column]
+            for column in ("headcount", "fees_tuition", "fees_total")
+        },
+    )
+    session.execute(statement, deltas(rows))
+
+
+def report(session, academic_year: str | None = None) -> dict:
+    query = select(StudentSummary).order_by(
+        StudentSummary.academic_year,
+        StudentSummary.dimension,
+        StudentSummary.headcount.desc(),
+        StudentSummary.value,
+    )
+    if academic_year is not None:
+        query = query.where(StudentSummary.academic_year == academic_year)
+    breakdowns = defaultdict(list)
+    for summary in session.scalars(query):
+        breakdowns[(summary.academic_year, summary.dimension)].append(summary)
+    return breakdowns
+
+
+def print_report(breakdowns: dict, dimensions: list[str]):
+    from rich.console import Console
+    from rich.table import Table
+
+    console = Console()
+    for (academic_year, dimension), summaries in breakdowns.items():
+        if dimension not in dimensions:
+            continue
+        headcount = sum(summary.headcount for summary in summaries)
+        table = Table(title=f"{academic_year} - {dimension}")
+        table.add_column("Value")
+        table.add_column("Headcount", justify="right")
+        table.add_column("Share", justify="right")
+        table.add_column("Tuition fees", justify="right")
+        table.add_column("Total fees", justify="right")
+        for summary in summaries:
+            table.add_row(
+                summary.value,
+                str(summary.headcount),
+                f"{summary.headcount / headcount:.1%}" if headcount else "",
+                f"{summary.fees_tuition:,.2f}",
+                f"{summary.fees_total:,.2f}",
+            )
+        console.print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Report CHE statistics from the student summary tables"
+    )
+    parser.add_argument("--academic-year", help="only report this academic year")
+    parser.add_argument(
+        "--dimension",
+        action="append",
+        choices=list(DIMENSIONS),
+        help="breakdowns to report (default: all); may be repeated",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="recompute the summaries from the students table first",
+    )
+    args = parser.parse_args()
+
+    session = Session()
+    try:
+        if args.rebuild:
+            started = time.perf_counter()
+            rows = rebuild(session)
+            elapsed = time.perf_counter() - started
+            print(f"Rebuilt {rows} summary rows in {elapsed:.2f}s")
+        else:
+            ensure_built(session)
+        print_report(
+            report(session, args.academic_year), args.dimension or list(DIMENSIONS)
+        )
+    finally:
+        session.close()
@@ -0,0 +1,91 @@
+import logging
+import threading
+from collections import Counter
+
+from rich.console import Group
+from rich.live import Live
+from rich.logging import RichHandler
+from rich.table import Table
+
+from metrics import Metrics
+
+
+def format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class Dashboard:
+    def __init__(self, metrics: Metrics, refresh_per_second: float = 2):
+        self.metrics = metrics
+        self.refresh_per_second = refresh_per_second
+        self._live: Live | None = None
+        self._handlers: list[logging.Handler] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def render(self):
+        # Stats are read from a snapshot taken under the metrics lock, since
+        # workers keep updating them while the refresh thread renders
+        snapshot = self.metrics.snapshot()
+        elapsed = max(snapshot["elapsed"], 1e-9)
+
+        stages = Table(title=f"Scraping run - {elapsed:.0f}s", expand=True)
+        stages.add_column("Stage")
+        stages.add_column("Count", justify="right")
+        stages.add_column("Rate/s", justify="right")
+        stages.add_column("p50 ms", justify="right")
+        stages.add_column("p95 ms", justify="right")
+        stages.add_column("Bytes", justify="right")
+        stages.add_column("Failures")
+        for name, stage in sorted(snapshot["stages"].items()):
+            failures = ", ".join(
+                f"{reason}={count}"
+                for reason, count in Counter(stage["failures"]).most_common(3)
+            )
+            stages.add_row(
+                name,
+                str(stage["count"]),
+                f"{stage['count'] / elapsed:.1f}",
+                f"{stage['p50'] * 1000:.1f}",
+                f"{stage['p95'] * 1000:.1f}",
+                format_bytes(stage["bytes"]) if stage["bytes"] else "",
+                failures,
+            )
+
+        events = Table(title="Events", expand=True)
+        events.add_column("Event")
+        events.add_column("Count", justify="right")
+        for event, count in sorted(snapshot["events"].items()):
+            events.add_row(event, str(count))
+        for name, value in sorted(snapshot["gauges"].items()):
+            events.add_row(name, f"{value:g}")
+
+        return Group(stages, events)
+
+    def _refresh(self):
+        while not self._stop.wait(1 / self.refresh_per_second):
+            self._live.update(self.render())
+
+    def __enter__(self):
+        self._live = Live(self.render(), refresh_per_second=self.refresh_per_second)
+        self._live.__enter__()
+
+        root = logging.getLogger()
+        self._handlers = root.handlers[:]
+        root.handlers = [
+            RichHandler(console=self._live.console, show_path=False, markup=False)
+        ]
+
+        self._thread = threading.Thread(target=self._refresh, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._live.update(self.render())
+        logging.getLogger().handlers = self._handlers
+        return self._live.__exit__(*exc_info)
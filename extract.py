@@ -0,0 +1,144 @@
+import logging
+import re
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+HTML_PARSER = etree.HTMLParser(encoding="utf-8")
+
+ROW_CLASS = " or ".join(
+    f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+    for name in ("ewTableRow", "ewTableAltRow")
+)
+
+TEXT = etree.XPath("string()")
+LIST_TABLE = etree.XPath("(//table[@id='ewlistmain'])[1]")
+TABLE_ROWS = etree.XPath(f".//tr[{ROW_CLASS}]")
+CELLS = etree.XPath(".//td")
+NEXT_LINK = etree.XPath("(//a[. = 'Next'])[1]")
+FIRST_LABEL_VALUE = etree.XPath("(//td[. = $label])[1]/following::td[1]")
+LAST_LABEL_VALUE = etree.XPath("(//td[. = $label])[last()]/following::td[1]")
+PAGER_RECORDS = etree.XPath("(//td[starts-with(normalize-space(), 'Records ')])[1]")
+RECORD_COUNT = re.compile(r"Records\s+(\d+)\s+to\s+(\d+)\s+of\s+(\d+)")
+
+
+def parse_html(html: str | bytes):
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+    root = etree.fromstring(html, HTML_PARSER) if html.strip() else None
+    if root is None:
+        root = etree.Element("html")
+    return root
+
+
+def text(element) -> str:
+    return TEXT(element)
+
+
+def first_value(root, label: str) -> str | None:
+    found = FIRST_LABEL_VALUE(root, label=label)
+    return text(found[0]) if found else None
+
+
+def last_value(root, label: str) -> str | None:
+    found = LAST_LABEL_VALUE(root, label=label)
+    return text(found[0]) if found else None
+
+
+def parse_student_list(root):
+    tables = LIST_TABLE(root)
+    if not tables:
+        return None, None
+
+    students = []
+    for row in TABLE_ROWS(tables[0]):
+        columns = CELLS(row)
+        if len(columns) < 7:
+            logger.warning(
+                f"Unexpected row format: {etree.tostring(row, encoding='unicode')}"
+            )
+            continue
+
+        students.append(
+            {
+                "school": text(columns[1]).strip(),
+                "student_number": text(columns[3]).strip(),
+                "name": text(columns[4]).strip(),
+                "student_status": text(columns[6]).strip(),
+            }
+        )
+
+    next_page = NEXT_LINK(root)
+    return students, next_page[0].attrib["href"] if next_page else None
+
+
+def parse_record_count(root):
+    found = PAGER_RECORDS(root)
+    match = RECORD_COUNT.search(text(found[0])) if found else None
+    if match is None:
+        return None
+    first, last, total = map(int, match.groups())
+    return first, last, total
+
+
+def parse_transcript(root):
+    program = first_value(root, "Program:")
+    program = program.strip() if program is not None else None
+
+    results = last_value(root, "Results:")
+    cgpa = results.strip().split(":")[-1].strip() if results is not None else None
+
+    semester = last_value(root, "Semester:")
+    academic_year = (
+        int(semester.split(",")[1].split()[1]) if semester is not None else None
+    )
+    return program, cgpa, academic_year
+
+
+def parse_program_list(root):
+    for row in TABLE_ROWS(root):
+        cells = CELLS(row)
+        if len(cells) >= 6 and text(cells[4]).strip() == "Active":
+            program = text(cells[0]).strip().split(" ")
+            program = " ".join(program[1:]).strip()
+            academic_year = int(text(cells[1]).strip().split("-")[0])
+            return program, academic_year
+    return None
+
+
+def parse_details(root):
+    details = {}
+    for label in ("Nationality", "Sex", "Birthdate", "Birth Place"):
+        value = first_value(root, label)
+        if value is None:
+            raise ValueError(f"'{label}' not found on personal view")
+        details[label] = value.strip()
+    return (
+        details["Nationality"],
+        details["Sex"],
+        details["Birthdate"],
+        details["Birth Place"],
+    )
+
+
+def parse_sponsor(root):
+    rows = TABLE_ROWS(root)
+    if not rows:
+        return None
+    cells = CELLS(rows[0])
+    return text(cells[5]).strip() if len(cells) >= 6 else ""
+
+
+EXTRACTORS = {
+    "student_list": parse_student_list,
+    "record_count": parse_record_count,
+    "transcript": parse_transcript,
+    "program_list": parse_program_list,
+    "details": parse_details,
+    "sponsor": parse_sponsor,
+}
+
+
+def extract(kind: str, html: str | bytes):
+    return EXTRACTORS[kind](parse_html(html))
@@ -0,0 +1,150 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SAVED = "saved"
+SKIPPED = "skipped"
+INCOMPLETE = "incomplete"
+ERROR = "error"
+FAILED_OUTCOMES = (INCOMPLETE, ERROR)
+FAILED_PLACEHOLDERS = ", ".join("?" * len(FAILED_OUTCOMES))
+
+
+class RunJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                page_number INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                next_url TEXT,
+                listed_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS students (
+                student_number TEXT PRIMARY KEY,
+                page_number INTEGER NOT NULL,
+                listing TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS students_outcome ON students (outcome, page_number)"
+        )
+        self._db.commit()
+
+    def reset(self):
+        with self._lock:
+            self._db.execute("DELETE FROM pages")
+            self._db.execute("DELETE FROM students")
+            self._db.commit()
+
+    def frontier(self) -> tuple[str | None, int] | None:
+        with self._lock:
+            row = self._db.execute(
+                """
+                SELECT pages.url, pages.page_number FROM students
+                JOIN pages ON pages.page_number = students.page_number
+                WHERE students.outcome = ?
+                ORDER BY students.page_number LIMIT 1
+                """,
+                (PENDING,),
+            ).fetchone()
+            if row:
+                return row[0], row[1]
+
+            last = self._db.execute(
+                "SELECT next_url, page_number FROM pages ORDER BY page_number DESC LIMIT 1"
+            ).fetchone()
+        if last is None:
+            return None
+        next_url, page_number = last
+        return next_url, page_number + 1
+
+    def record_page(
+        self, page_number: int, url: str, next_url: str | None, students: list[dict]
+    ) -> list[dict]:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                (page_number, url, next_url, now),
+            )
+            self._db.executemany(
+                """
+                INSERT INTO students VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (student_number) DO UPDATE SET
+                    page_number = excluded.page_number,
+                    listing = excluded.listing
+                """,
+                [
+                    (
+                        student["student_number"],
+                        page_number,
+                        json.dumps(student),
+                        PENDING,
+                        now,
+                    )
+                    for student in students
+                ],
+            )
+            self._db.commit()
+            failed = {
+                row[0]
+                for row in self._db.execute(
+                    f"""
+                    SELECT student_number FROM students
+                    WHERE page_number = ? AND outcome IN ({FAILED_PLACEHOLDERS})
+                    """,
+                    (page_number, *FAILED_OUTCOMES),
+                )
+            }
+        return [s for s in students if s["student_number"] not in failed]
+
+    def record_outcome(self, student_number: str, outcome: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE students SET outcome = ?, updated_at = ? WHERE student_number = ?",
+                (outcome, time.time(), student_number),
+            )
+            self._db.commit()
+
+    def record_outcomes(self, student_numbers: list[str], outcome: str):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "UPDATE students SET outcome = ?, updated_at = ? WHERE student_number = ?",
+                [(outcome, now, student_number) for student_number in student_numbers],
+            )
+            self._db.commit()
+
+    def failed_students(self) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                f"""
+                SELECT listing FROM students
+                WHERE outcome IN ({FAILED_PLACEHOLDERS})
+                ORDER BY page_number, student_number
+                """,
+                FAILED_OUTCOMES,
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,79 +1,121 @@
+import argparse
 import logging
+import multiprocessing
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
-from sqlalchemy.exc import SQLAlchemyError
-
-from browser import BASE_URL, Browser
-from student import Session, Student
+import profiling
+from browser import BASE_URL, MAX_REQUESTS_PER_HOST, Browser
+from cache import ResponseCache
+from extract import EXTRACTORS, extract, parse_html
+from journal import ERROR, INCOMPLETE, SAVED, SKIPPED, RunJournal
+from metrics import metrics
+from rules import derive_student, parse_cgpa
+from transport import MAX_RETRIES
+from work_queue import CLAIM_BATCH, WorkQueue
+from writer import DEFAULT_BATCH_SIZE, StudentWriter, fingerprint
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
+PARSED_PAGE_LIMIT = 32
+STUDENT_QUEUE_SIZE = 200
+BULK_PAGE_SIZE = "ALL"
+
+
+def program_list_url(student_id):
+    return f"{BASE_URL}/r_stdprogramlist.php?showmaster=1&StudentID={student_id}"
+
+
+def details_url(student_id):
+    return f"{BASE_URL}/r_stdpersonalview.php?StudentID={student_id}"
+
 
 class WebScraper:
-    def __init__(self):
+    def __init__(self, parse_pool=None, prefetch_pool=None):
         self.browser = Browser()
+        self.parse_pool = parse_pool
+        self.prefetch_pool = prefetch_pool
+        self._pages = OrderedDict()
+        self._pages_lock = threading.Lock()
+        self._prefetched = {}
+
+    def fetch(self, url):
+        with self._pages_lock:
+            prefetched = self._prefetched.pop(url, None)
+        if prefetched is not None and prefetched.exception() is None:
+            return prefetched.result()
+        return self.browser.fetch(url)
+
+    def fetch_page(self, url):
+        response = self.fetch(url)
+        with self._pages_lock:
+            cached = self._pages.get(url)
+            if cached is not None and cached[0] is response:
+                self._pages.move_to_end(url)
+                return cached[1]
+
+        with metrics.timed("parse_html"):
+            page = parse_html(response.text)
+        with self._pages_lock:
+            self._pages[url] = (response, page)
+            self._pages.move_to_end(url)
+            while len(self._pages) > PARSED_PAGE_LIMIT:
+                self._pages.popitem(last=False)
+        return page
+
+    def prefetch(self, student_id):
+        # Start the pages that do not depend on the transcript. The programme
+        # list is both the sponsor page and the transcript fallback, so it is
+        # already in flight if the fallback turns out to be needed.
+        if self.prefetch_pool is None:
+            return
+        for url in (details_url(student_id), program_list_url(student_id)):
+            prefetched = self.prefetch_pool.submit(self.browser.fetch, url)
+            with self._pages_lock:
+                self._prefetched[url] = prefetched
+
+    def extract(self, kind, url):
+        if self.parse_pool is None:
+            page = self.fetch_page(url)
+            with metrics.timed(f"scrape_{kind}"):
+                return EXTRACTORS[kind](page)
+
+        response = self.fetch(url)
+        with metrics.timed(f"scrape_{kind}"):
+            return self.parse_pool.submit(extract, kind, response.text).result()
 
     def scrape_student_list(self, url):
         try:
-            response = self.browser.fetch(url)
-            soup = BeautifulSoup(response.text, "lxml")
-            students = []
-
-            table = soup.find("table", id="ewlistmain")
-            if not table:
+            students, next_page = self.extract("student_list", url)
+            if students is None:
                 logger.warning(f"No student table found on page: {url}")
                 return [], None
 
-            rows = table.find_all("tr", class_=["ewTableRow", "ewTableAltRow"])
-
-            for row in rows:
-                columns = row.find_all("td")
-                if len(columns) < 7:
-                    logger.warning(f"Unexpected row format: {row}")
-                    continue
-
-                student = {
-                    "school": columns[1].text.strip(),
-                    "student_number": columns[3].text.strip(),
-                    "name": columns[4].text.strip(),
-                    "student_status": columns[6].text.strip(),
-                }
-                students.append(student)
-
             logger.info(f"Scraped {len(students)} students from the current page")
-
-            next_page = soup.find("a", text="Next")
-            return students, next_page["href"] if next_page else None
+            return students, next_page
         except Exception as e:
             logger.error(f"Error scraping student list: {str(e)}")
             return [], None
 
+    def scrape_record_count(self, url):
+        try:
+            return self.extract("record_count", url)
+        except Exception as e:
+            logger.error(f"Error reading record count: {str(e)}")
+            return None
+
     def scrape_transcript(self, student_id):
         try:
             url = f"{BASE_URL}/Officialreport.php?showmaster=1&StudentID={student_id}"
-            response = self.browser.fetch(url)
-            soup = BeautifulSoup(response.text, "lxml")
-
-            program_td = soup.find("td", string="Program:")
-            program = program_td.find_next("td").text.strip() if program_td else None
-
-            results_td = soup.find_all("td", string="Results:")
-            cgpa = (
-                results_td[-1].find_next("td").text.strip().split(":")[-1].strip()
-                if results_td
-                else None
-            )
-
-            semester_tds = soup.find_all("td", string="Semester:")
-            academic_year = (
-                int(semester_tds[-1].find_next("td").text.split(",")[1].split()[1])
-                if semester_tds
-                else None
-            )
+            program, cgpa, academic_year = self.extract("transcript", url)
 
             logger.info(
                 f"Scraped transcript for student {student_id}: Program={program}, CGPA={cgpa}, Academic Year={academic_year}"
@@ -87,29 +129,19 @@ class WebScraper:
 
     def scrape_program_list(self, student_id):
         try:
-            url = f"{BASE_URL}/r_stdprogramlist.php?showmaster=1&StudentID={student_id}"
-            response = self.browser.fetch(url)
-            soup = BeautifulSoup(response.text, "lxml")
+            url = program_list_url(student_id)
+            active_program = self.extract("program_list", url)
 
-            rows = soup.find_all("tr", class_=["ewTableRow", "ewTableAltRow"])
-
-            for row in rows:
-                cells = row.find_all("td")
-                if len(cells) >= 6 and cells[4].text.strip() == "Active":
-                    program = cells[0].text.strip().split(" ")
-                    program = " ".join(program[1:]).strip()
-                    academic_year = cells[1].text.strip()
-
-                    academic_year = int(academic_year.split("-")[0])
-
-                    logger.info(
-                        f"Scraped active program for student {student_id}: Program={program}, Academic Year={academic_year}"
-                    )
-                    return (
-                        program,
-                        "-1",
-                        1,
-                    )
+            if active_program:
+                program, academic_year = active_program
+                logger.info(
+                    f"Scraped active program for student {student_id}: Program={program}, Academic Year={academic_year}"
+                )
+                return (
+                    program,
+                    "-1",
+                    1,
+                )
 
             logger.warning(f"No active program found for student {student_id}")
             return None, None, None
@@ -121,18 +153,8 @@ class WebScraper:
 
     def scrape_details(self, student_id):
         try:
-            url = f"{BASE_URL}/r_stdpersonalview.php?StudentID={student_id}"
-            response = self.browser.fetch(url)
-            soup = BeautifulSoup(response.text, "lxml")
-
-            nationality = (
-                soup.find("td", string="Nationality").find_next("td").text.strip()
-            )
-            sex = soup.find("td", string="Sex").find_next("td").text.strip()
-            birthdate = soup.find("td", string="Birthdate").find_next("td").text.strip()
-            birth_place = (
-                soup.find("td", string="Birth Place").find_next("td").text.strip()
-            )
+            url = details_url(student_id)
+            nationality, sex, birthdate, birth_place = self.extract("details", url)
 
             logger.info(
                 f"Scraped details for student {student_id}: Nationality={nationality}, Sex={sex}, Birthdate={birthdate}"
@@ -144,16 +166,10 @@ class WebScraper:
 
     def scrape_sponsor(self, student_id):
         try:
-            url = f"{BASE_URL}/r_stdprogramlist.php?showmaster=1&StudentID={student_id}"
-            response = self.browser.fetch(url)
-            soup = BeautifulSoup(response.text, "lxml")
-
-            program_row = soup.find("tr", class_=["ewTableRow", "ewTableAltRow"])
+            url = program_list_url(student_id)
+            asst_provider = self.extract("sponsor", url)
 
-            if program_row:
-                cells = program_row.find_all("td")
-                asst_provider = cells[5].text.strip() if len(cells) >= 6 else ""
-            else:
+            if asst_provider is None:
                 logger.warning(
                     f"Program information row not found for student {student_id}"
                 )
@@ -168,63 +184,23 @@ class WebScraper:
             return ""
 
 
-def get_faculty_or_school(code):
-    faculty_map = {
-        "FAID": "Faculty of Architecture and the Built Environment",
-        "FBS": "Faculty of Business and Globalization",
-        "FCM": "Faculty of Communication, Media and Broadcasting",
-        "FCO": "Faculty of Communication, Media and Broadcasting",
-        "FCTH": "Faculty of Creativity in Tourism & Hospitality",
-        "FDSI": "Faculty of Design and Innovation",
-        "FFLD": "Faculty of Design and Innovation",
-        "FFTB": "Faculty of Communication, Media and Broadcasting",
-        "FINT": "Faculty of Information & Communication Technology",
-        "FMS": "Faculty of Communication, Media and Broadcasting",
-    }
-    return faculty_map.get(code, "Unknown")
-
-
-def get_duration_of_program(program: str):
-    if "diploma" in program.lower() or "associate" in program.lower():
-        return 3
-    elif "certificate" in program.lower():
-        return 1
-    return 4
-
-
-def get_qualification(program: str):
-    if "diploma" in program.lower() or "associate" in program.lower():
-        return 1
-    elif "certificate" in program.lower():
-        return 2
-    return 3
-
-
-def get_student_status(program: str, year_of_study: int):
-    program_duration = get_duration_of_program(program)
-    return "Completer" if year_of_study == program_duration else "Continuing Student"
-
-
-def get_tuition_fee(qualification: int, year_of_study: int):
-    fee_map = {
-        (1, 1): 12000,
-        (2, 1): 19475,
-        (2, 2): 19988,
-        (3, 1): 19988,
-    }
-    return fee_map.get((qualification, year_of_study), 25625)
-
-
-def process_student(scraper, student, session):
+def process_student(scraper, student, writer):
     try:
         student_number = student["student_number"]
-        exists = session.query(Student).get(student_number)
-        if exists:
+        listing_fingerprint = fingerprint(
+            student["school"], student["name"], student["student_status"]
+        )
+        if writer.refresh:
+            if writer.is_fresh(student_number, listing_fingerprint):
+                logger.info(f"Student {student_number} is unchanged, skipping")
+                return SKIPPED
+        elif writer.exists(student_number):
             logger.warning(
                 f"Student {student_number} already exists in the database, skipping"
             )
-            return False
+            return SKIPPED
 
+        scraper.prefetch(student_number)
         program, cgpa, academic_year = scraper.scrape_transcript(student_number)
 
         if not all([program, cgpa, academic_year]):
@@ -240,104 +216,661 @@ def process_student(scraper, student, session):
 
         if not all([program, cgpa, academic_year, sex, birthdate]):
             logger.warning(f"Incomplete data for student {student_number}, skipping")
-            return False
+            return INCOMPLETE
 
-        names = student["name"].split()
-        surname = names[-1]
-        first_name = " ".join(names[:-1])
-
-        try:
-            cgpa_float = float(cgpa)
-            if cgpa_float < 0:
-                overall_exam_mark = 999
-            else:
-                overall_exam_mark = int(cgpa_float * 25)
-        except ValueError:
+        cgpa_value = parse_cgpa(cgpa)
+        if cgpa_value is None:
             logger.warning(f"Invalid CGPA value for student {student_number}: {cgpa}")
-            overall_exam_mark = None
 
-        qualification = get_qualification(program)
-        new_student = Student(
+        raw = dict(
             student_number=int(student_number),
-            academic_year="2023/2024",
-            first_name=first_name,
-            surname=surname,
-            date_of_birth=birthdate,
-            gender=sex,
-            nationality=nationality or "Unknown",
-            faculty_or_school=get_faculty_or_school(student["school"]),
+            school=student["school"],
+            name=student["name"],
+            listing_status=student["student_status"],
             program=program,
-            duration_on_program=get_duration_of_program(program),
+            cgpa=cgpa,
+            cgpa_value=cgpa_value,
             year_of_study=academic_year,
-            qualification=qualification,
-            student_status=get_student_status(program, academic_year),
-            overall_exam_mark=overall_exam_mark,
-            graduate_status=(
-                "Passed" if overall_exam_mark and overall_exam_mark >= 50 else "Failed"
+            nationality=nationality,
+            sex=sex,
+            birthdate=birthdate,
+            birth_place=birth_place,
+            asst_provider=asst_provider,
+            listing_fingerprint=listing_fingerprint,
+            details_fingerprint=fingerprint(
+                program,
+                cgpa,
+                academic_year,
+                nationality,
+                sex,
+                birthdate,
+                birth_place,
+                asst_provider,
             ),
-            fees_tuition=get_tuition_fee(qualification, academic_year),
-            type_of_main_sponsor="Government" if asst_provider == "NMDS" else "Other",
-            name_of_main_sponsor=asst_provider or "Unknown",
         )
-
-        session.add(new_student)
-        session.commit()
-        logger.info(f"Saved student {student_number} to the database")
-        return True
-    except SQLAlchemyError as e:
-        session.rollback()
-        logger.error(f"Error saving student {student_number} to database: {str(e)}")
-        return False
+        writer.add(derive_student(raw), raw)
+        logger.info(f"Queued student {student_number} for saving")
+        return SAVED
     except Exception as e:
         logger.error(f"Unexpected error processing student {student_number}: {str(e)}")
-        return False
-
+        return ERROR
 
-def main():
-    scraper = WebScraper()
-    scraper.browser.login()
-    session = Session()
 
-    scraper.browser.fetch(
-        "https://cmslesothosandbox.limkokwing.net/campus/registry/r_studentviewlist.php?x_InstitutionID=1&z_InstitutionID=%3D%2C%2C&x_LatestTerm=2022-08&z_LatestTerm=LIKE%2C%27%25%2C%25%27"
-    )
+def put_until_stopped(items, item, stop):
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
 
-    student_list_url = f"{BASE_URL}/r_studentviewlist.php"
-    page_number = 1
-    total_students_processed = 0
-    total_students_saved = 0
 
+def produce_students(
+    scraper, student_list_url, students, stop, journal=None, page_number=1
+):
     try:
-        while student_list_url:
+        while student_list_url and not stop.is_set():
             logger.info(
                 f"Scraping student list from page {page_number}: {student_list_url}"
             )
-            students, next_page = scraper.scrape_student_list(student_list_url)
-
-            for student in students:
-                if process_student(scraper, student, session):
-                    total_students_saved += 1
-                total_students_processed += 1
+            page_students, next_page = scraper.scrape_student_list(student_list_url)
+            next_url = f"{BASE_URL}/{next_page}" if next_page else None
 
-                if total_students_processed % 10 == 0:
+            if journal is not None and (page_students or next_url):
+                listed = len(page_students)
+                page_students = journal.record_page(
+                    page_number, student_list_url, next_url, page_students
+                )
+                if len(page_students) < listed:
                     logger.info(
-                        f"Progress: Processed {total_students_processed} students, Saved {total_students_saved} students"
+                        f"Skipping {listed - len(page_students)} students that failed in a previous run"
                     )
 
-            if next_page:
-                student_list_url = f"{BASE_URL}/{next_page}"
-                page_number += 1
-            else:
-                student_list_url = None
-                logger.info(
-                    f"Finished scraping all student pages. Total students processed: {total_students_processed}, Total students saved: {total_students_saved}"
+            for student in page_students:
+                if not put_until_stopped(students, student, stop):
+                    return
+
+            student_list_url = next_url
+            page_number += 1
+    except Exception as e:
+        logger.error(f"Error walking student list pages: {str(e)}")
+    finally:
+        put_until_stopped(students, None, stop)
+
+
+def bulk_listing_url(page_size=BULK_PAGE_SIZE):
+    return f"{BASE_URL}/r_studentviewlist.php?recperpage={page_size}"
+
+
+def list_students_bulk(
+    scraper, page_size=BULK_PAGE_SIZE, parallel=MAX_REQUESTS_PER_HOST
+):
+    url = bulk_listing_url(page_size)
+    logger.info(f"Requesting {page_size} students per listing page: {url}")
+    page_students, next_page = scraper.scrape_student_list(url)
+    pages = [page_students]
+    records = scraper.scrape_record_count(url)
+
+    if records is None:
+        logger.warning("Student list has no record count, following Next links")
+        while next_page:
+            page_students, next_page = scraper.scrape_student_list(
+                f"{BASE_URL}/{next_page}"
+            )
+            pages.append(page_students)
+    else:
+        first, last, total = records
+        if last < total:
+            # The page size is kept in the CMS session, so later start= offsets
+            # come back in pages of the same (capped) size
+            starts = range(last + 1, total + 1, last - first + 1)
+            logger.info(
+                f"Student list is capped at {last - first + 1} rows per page, fetching {len(starts)} more pages in parallel"
+            )
+            with ThreadPoolExecutor(max_workers=parallel) as pool:
+                pages += pool.map(
+                    lambda start: scraper.scrape_student_list(
+                        f"{BASE_URL}/r_studentviewlist.php?start={start}"
+                    )[0],
+                    starts,
                 )
 
+    students = {}
+    for page_students in pages:
+        for student in page_students:
+            students.setdefault(student["student_number"], student)
+    if records is not None and len(students) < records[2]:
+        logger.warning(f"Listed {len(students)} of {records[2]} students")
+    return list(students.values())
+
+
+def produce_bulk_students(
+    scraper,
+    students,
+    stop,
+    page_size=BULK_PAGE_SIZE,
+    parallel=MAX_REQUESTS_PER_HOST,
+    journal=None,
+):
+    try:
+        listed = list_students_bulk(scraper, page_size, parallel)
+        logger.info(f"Listed {len(listed)} students")
+        if journal is not None:
+            listed = journal.record_page(1, bulk_listing_url(page_size), None, listed)
+        for student in listed:
+            if not put_until_stopped(students, student, stop):
+                return
     except Exception as e:
-        logger.error(f"An unexpected error occurred: {str(e)}")
+        logger.error(f"Error listing students: {str(e)}")
     finally:
-        session.close()
+        put_until_stopped(students, None, stop)
+
+
+def produce_failed_students(journal, students, stop):
+    failed = journal.failed_students()
+    logger.info(f"Retrying {len(failed)} students that failed in a previous run")
+    try:
+        for student in failed:
+            if not put_until_stopped(students, student, stop):
+                return
+    finally:
+        put_until_stopped(students, None, stop)
+
+
+def produce_claimed_students(
+    work_queue, students, stop, writer, claim_batch=CLAIM_BATCH
+):
+    try:
+        while not stop.is_set():
+            # Tasks only become done when their rows are written, so students
+            # from earlier claims are not left buffered while their leases run
+            writer.flush()
+            claimed = work_queue.claim(claim_batch)
+            if not claimed:
+                logger.info("No unclaimed students left in the work queue")
+                return
+            logger.info(f"Claimed {len(claimed)} students from the work queue")
+            for student in claimed:
+                if not put_until_stopped(students, student, stop):
+                    return
+    except Exception as e:
+        logger.error(f"Error claiming students from the work queue: {str(e)}")
+    finally:
+        put_until_stopped(students, None, stop)
+
+
+def enqueue_students(scraper, student_list_url, work_queue):
+    listed = queued = 0
+    page_number = 1
+    while student_list_url:
+        logger.info(f"Queueing students from page {page_number}: {student_list_url}")
+        page_students, next_page = scraper.scrape_student_list(student_list_url)
+        listed += len(page_students)
+        queued += work_queue.enqueue(page_students)
+        student_list_url = f"{BASE_URL}/{next_page}" if next_page else None
+        page_number += 1
+    return listed, queued
+
+
+def consume_students(scraper, students, writer, results, stop, outcomes=None):
+    try:
+        while not stop.is_set():
+            try:
+                student = students.get(timeout=1)
+            except queue.Empty:
+                continue
+            if student is None:
+                students.put(None)
+                return
+            outcome = process_student(scraper, student, writer)
+            metrics.increment(f"students_{outcome}")
+            # The writer records saved students once their batch commits
+            if outcomes is not None and outcome != SAVED:
+                outcomes.record_outcome(student["student_number"], outcome)
+            results.put(outcome)
+    finally:
+        results.put(None)
+
+
+def main(
+    workers=1,
+    per_host=MAX_REQUESTS_PER_HOST,
+    cache=None,
+    replay=False,
+    batch_size=DEFAULT_BATCH_SIZE,
+    queue_size=STUDENT_QUEUE_SIZE,
+    journal=None,
+    resume=False,
+    retry_failed=False,
+    rate=None,
+    max_retries=MAX_RETRIES,
+    dashboard=False,
+    metrics_out=None,
+    adaptive=False,
+    parse_processes=0,
+    speculative=False,
+    hedge=False,
+    cookie_jar=None,
+    keep_alive=None,
+    bulk_listing=None,
+    refresh=False,
+    max_age=None,
+    work_queue=None,
+    enqueue=False,
+    claim_batch=CLAIM_BATCH,
+):
+    parse_pool = None
+    if parse_processes:
+        parse_pool = ProcessPoolExecutor(
+            max_workers=parse_processes,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    prefetch_pool = None
+    if speculative:
+        prefetch_pool = ThreadPoolExecutor(
+            max_workers=2 * workers, thread_name_prefix="prefetch"
+        )
+    scraper = WebScraper(parse_pool=parse_pool, prefetch_pool=prefetch_pool)
+    scraper.browser.set_host_limit(per_host)
+    scraper.browser.enable_hedging(hedge)
+    scraper.browser.configure_transport(
+        rate=rate, max_retries=max_retries, adaptive=adaptive
+    )
+    # Refreshes need current pages, so the cache is only written to
+    scraper.browser.use_cache(cache, replay=replay, read_cache=not refresh)
+    scraper.browser.use_cookie_jar(cookie_jar)
+    scraper.browser.login()
+    if keep_alive:
+        scraper.browser.start_keep_alive(keep_alive)
+
+    scraper.browser.fetch(
+        f"{BASE_URL}/r_studentviewlist.php?x_InstitutionID=1&z_InstitutionID=%3D%2C%2C&x_LatestTerm=2022-08&z_LatestTerm=LIKE%2C%27%25%2C%25%27"
+    )
+
+    if enqueue:
+        try:
+            if bulk_listing:
+                listed = list_students_bulk(scraper, bulk_listing, per_host)
+                listed, queued = len(listed), work_queue.enqueue(listed)
+            else:
+                listed, queued = enqueue_students(
+                    scraper, f"{BASE_URL}/r_studentviewlist.php", work_queue
+                )
+            logger.info(f"Listed {listed} students, queued {queued} new crawl tasks")
+        finally:
+            scraper.browser.stop_keep_alive()
+            if cache is not None:
+                cache.close()
+            if parse_pool is not None:
+                parse_pool.shutdown()
+            if prefetch_pool is not None:
+                prefetch_pool.shutdown()
+        return
+
+    writer = StudentWriter(
+        batch_size=batch_size,
+        refresh=refresh,
+        max_age=max_age,
+        journal=journal,
+        work_queue=work_queue,
+    )
+    writer.load_existing()
+
+    if work_queue is not None:
+        # Only hold as many claimed students as one batch so other workers
+        # can pick up the rest
+        queue_size = min(queue_size, claim_batch)
+    students = queue.Queue(maxsize=queue_size)
+    results = queue.Queue()
+    stop = threading.Event()
+
+    outcomes = journal
+    if work_queue is not None:
+        outcomes = work_queue
+        producer = threading.Thread(
+            target=produce_claimed_students,
+            args=(work_queue, students, stop, writer, claim_batch),
+            name="work-queue",
+            daemon=True,
+        )
+    elif retry_failed:
+        producer = threading.Thread(
+            target=produce_failed_students,
+            args=(journal, students, stop),
+            name="student-list",
+            daemon=True,
+        )
+    elif bulk_listing:
+        if journal is not None and not resume:
+            journal.reset()
+        producer = threading.Thread(
+            target=produce_bulk_students,
+            args=(scraper, students, stop, bulk_listing, per_host, journal),
+            name="student-list",
+            daemon=True,
+        )
+    else:
+        student_list_url = f"{BASE_URL}/r_studentviewlist.php"
+        page_number = 1
+        frontier = journal.frontier() if journal is not None and resume else None
+        if frontier is not None:
+            student_list_url, page_number = frontier
+            if student_list_url is None:
+                logger.info("All student pages were listed by the previous run")
+            else:
+                logger.info(f"Resuming from page {page_number}: {student_list_url}")
+        elif journal is not None:
+            journal.reset()
+
+        producer = threading.Thread(
+            target=produce_students,
+            args=(scraper, student_list_url, students, stop, journal, page_number),
+            name="student-list",
+            daemon=True,
+        )
+
+    threads = [producer]
+    threads += [
+        threading.Thread(
+            target=consume_students,
+            args=(scraper, students, writer, results, stop, outcomes),
+            name=f"student-{number}",
+            daemon=True,
+        )
+        for number in range(workers)
+    ]
+    total_students_processed = 0
+    finished = False
+
+    display = nullcontext()
+    if dashboard:
+        from dashboard import Dashboard
+
+        display = Dashboard(metrics)
+
+    with display:
+        try:
+            for thread in threads:
+                thread.start()
+
+            running_consumers = workers
+            while running_consumers:
+                outcome = results.get()
+                if outcome is None:
+                    running_consumers -= 1
+                    continue
+
+                total_students_processed += 1
+
+                if total_students_processed % 10 == 0:
+                    progress = f"Progress: Processed {total_students_processed} students, Saved {writer.saved} students"
+                    limiter = scraper.browser.transport.limiter
+                    if limiter is not None:
+                        progress += f", Concurrency limit {limiter.limit}"
+                    logger.info(progress)
+            finished = True
+        except Exception as e:
+            logger.error(f"An unexpected error occurred: {str(e)}")
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            scraper.browser.stop_keep_alive()
+            writer.flush()
+            logger.info(
+                f"Wrote {writer.saved} students to the database, {writer.failed} failed"
+            )
+            # Students only count as saved once the writer has committed them
+            if finished:
+                logger.info(
+                    f"Finished scraping all student pages. Total students processed: {total_students_processed}, Total students saved: {writer.saved}"
+                )
+            writer.rebuild_summaries()
+            if work_queue is not None:
+                released = work_queue.release()
+                if released:
+                    logger.info(f"Released {released} unprocessed crawl tasks")
+                logger.info(f"Work queue: {work_queue.counts()}")
+            if cache is not None:
+                cache.close()
+            if journal is not None:
+                journal.close()
+            if parse_pool is not None:
+                parse_pool.shutdown()
+            if prefetch_pool is not None:
+                prefetch_pool.shutdown()
+
+    if metrics_out:
+        metrics.write(metrics_out)
+        logger.info(f"Wrote run metrics to {metrics_out}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape student records from the CMS")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of students processed concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=STUDENT_QUEUE_SIZE,
+        help=f"students listed ahead of the workers (default: {STUDENT_QUEUE_SIZE})",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=MAX_REQUESTS_PER_HOST,
+        help=f"maximum in-flight requests per host (default: {MAX_REQUESTS_PER_HOST})",
+    )
+    parser.add_argument(
+        "--parse-processes",
+        type=int,
+        default=0,
+        metavar="N",
+        help="parse pages in N worker processes instead of the I/O threads",
+    )
+    parser.add_argument(
+        "--speculative",
+        action="store_true",
+        help="fetch each student's personal and programme pages while the "
+        "transcript is loading",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="send a duplicate request when a page takes longer than the recent "
+        "p95 and use whichever response arrives first",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        metavar="PER_SECOND",
+        help="limit requests to PER_SECOND across all workers",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=MAX_RETRIES,
+        help=f"retries for 5xx responses and connection errors (default: {MAX_RETRIES})",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="adjust in-flight requests between 1 and --per-host from CMS latency "
+        "and errors; use at least as many --workers as --per-host",
+    )
+    parser.add_argument(
+        "--cookie-jar",
+        metavar="PATH",
+        help="save session cookies to PATH after logging in and reuse them on "
+        "the next run while they are still valid",
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=float,
+        metavar="SECONDS",
+        help="check the session every SECONDS and log in again once it expires",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="PATH",
+        help="store fetched pages in a compressed on-disk cache at PATH; student "
+        "list pages are only read back with --replay, and nothing is with --refresh",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        metavar="SECONDS",
+        help="treat cached pages older than SECONDS as stale",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        metavar="MB",
+        help="evict least recently used pages once the cache exceeds MB",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="serve pages only from --cache, without logging in or using the network",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"students written to the database per insert (default: {DEFAULT_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--bulk-listing",
+        nargs="?",
+        const=BULK_PAGE_SIZE,
+        metavar="SIZE",
+        help="list students SIZE (default: ALL) rows per page, fetching any "
+        "further pages in parallel, instead of following Next links",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="re-scrape students whose listing row changed and upsert them, "
+        "instead of skipping every student already in the database",
+    )
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        metavar="HOURS",
+        help="with --refresh, also re-scrape students last scraped over HOURS ago",
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="PATH",
+        help="record listing progress and per-student outcomes in PATH",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the run recorded in --journal instead of starting over",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="only reprocess the incomplete or failed students in --journal",
+    )
+    parser.add_argument(
+        "--dashboard",
+        action="store_true",
+        help="show live per-stage metrics while the run is in progress",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=profiling.PROFILE_MODES,
+        help="profile the run: sampled flame graph stacks, cProfile stats per "
+        "stage, or tracemalloc allocation sites (not inside --parse-processes)",
+    )
+    parser.add_argument(
+        "--profile-out",
+        default=profiling.PROFILE_DIR,
+        metavar="DIR",
+        help=f"directory for --profile output (default: {profiling.PROFILE_DIR})",
+    )
+    parser.add_argument(
+        "--metrics-out",
+        metavar="PATH",
+        help="write a metrics snapshot to PATH at the end of the run "
+        "(JSON for .json files, Prometheus text otherwise)",
+    )
+    parser.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="walk the student list into the shared crawl_tasks table and exit",
+    )
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="process students claimed from the crawl_tasks table; run one per "
+        "process or machine against the same database",
+    )
+    parser.add_argument(
+        "--claim-batch",
+        type=int,
+        default=CLAIM_BATCH,
+        help=f"students a worker claims at a time (default: {CLAIM_BATCH})",
+    )
+    args = parser.parse_args()
+    if args.max_age is not None and not args.refresh:
+        parser.error("--max-age requires --refresh")
+    if args.enqueue and args.worker:
+        parser.error("--enqueue and --worker are separate modes")
+    if (args.enqueue or args.worker) and args.journal:
+        parser.error("--journal cannot be combined with --enqueue or --worker")
+    if args.replay and not args.cache:
+        parser.error("--replay requires --cache")
+    if (args.resume or args.retry_failed) and not args.journal:
+        parser.error("--resume and --retry-failed require --journal")
+    return args
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    cache = None
+    if args.cache:
+        cache = ResponseCache(
+            args.cache,
+            ttl=args.cache_ttl,
+            max_bytes=(
+                int(args.cache_max_mb * 1024 * 1024) if args.cache_max_mb else None
+            ),
+        )
+    with profiling.profile(args.profile, args.profile_out):
+        main(
+            workers=args.workers,
+            per_host=args.per_host,
+            cache=cache,
+            replay=args.replay,
+            batch_size=args.batch_size,
+            queue_size=args.queue_size,
+            journal=RunJournal(args.journal) if args.journal else None,
+            resume=args.resume,
+            retry_failed=args.retry_failed,
+            rate=args.rate,
+            max_retries=args.retries,
+            dashboard=args.dashboard,
+            metrics_out=args.metrics_out,
+            adaptive=args.adaptive,
+            parse_processes=args.parse_processes,
+            speculative=args.speculative,
+            hedge=args.hedge,
+            cookie_jar=args.cookie_jar,
+            keep_alive=args.keep_alive,
+            bulk_listing=args.bulk_listing,
+            refresh=args.refresh,
+            max_age=(
+                timedelta(hours=args.max_age) if args.max_age is not None else None
+            ),
+            work_queue=WorkQueue() if args.enqueue or args.worker else None,
+            enqueue=args.enqueue,
+            claim_batch=args.claim_batch,
+        )
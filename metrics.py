@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import profiling
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RECENT_SAMPLES = 2048
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.failures = Counter()
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds: float, size: int = 0, failure: str | None = None):
+        self.count += 1
+        self.seconds += seconds
+        self.bytes += size
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.recent.append(seconds)
+        if failure:
+            self.failures[failure] += 1
+
+    def percentile(self, p: float) -> float:
+        samples = sorted(self.recent)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "seconds": round(self.seconds, 6),
+            "bytes": self.bytes,
+            "p50": round(self.percentile(50), 6),
+            "p95": round(self.percentile(95), 6),
+            "failures": dict(self.failures),
+            "buckets": dict(
+                zip([*map(str, LATENCY_BUCKETS), "+Inf"], self.buckets)
+            ),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self._stages: dict[str, StageStats] = {}
+        self._events = Counter()
+        self._gauges: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self, stage: str, seconds: float, size: int = 0, failure: str | None = None
+    ):
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats(stage)
+            stats.observe(seconds, size, failure)
+
+    @contextmanager
+    def timed(self, stage: str):
+        started = time.perf_counter()
+        try:
+            with profiling.stage(stage):
+                yield
+        except Exception as e:
+            self.observe(stage, time.perf_counter() - started, failure=type(e).__name__)
+            raise
+        self.observe(stage, time.perf_counter() - started)
+
+    def increment(self, event: str, amount: int = 1):
+        with self._lock:
+            self._events[event] += amount
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def gauges(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._gauges)
+
+    def stages(self) -> list[StageStats]:
+        with self._lock:
+            return list(self._stages.values())
+
+    def events(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._events)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "elapsed": round(time.monotonic() - self.started, 3),
+                "stages": {name: s.snapshot() for name, s in self._stages.items()},
+                "events": dict(self._events),
+                "gauges": dict(self._gauges),
+            }
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = [
+            "# TYPE scraper_stage_duration_seconds histogram",
+        ]
+        for name, stage in snapshot["stages"].items():
+            cumulative = 0
+            for le, count in stage["buckets"].items():
+                cumulative += count
+                lines.append(
+                    f'scraper_stage_duration_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}'
+                )
+            lines.append(
+                f'scraper_stage_duration_seconds_sum{{stage="{name}"}} {stage["seconds"]}'
+            )
+            lines.append(
+                f'scraper_stage_duration_seconds_count{{stage="{name}"}} {stage["count"]}'
+            )
+        lines.append("# TYPE scraper_stage_bytes_total counter")
+        for name, stage in snapshot["stages"].items():
+            lines.append(f'scraper_stage_bytes_total{{stage="{name}"}} {stage["bytes"]}')
+        lines.append("# TYPE scraper_stage_failures_total counter")
+        for name, stage in snapshot["stages"].items():
+            for reason, count in stage["failures"].items():
+                lines.append(
+                    f'scraper_stage_failures_total{{stage="{name}",reason="{reason}"}} {count}'
+                )
+        lines.append("# TYPE scraper_events_total counter")
+        for event, count in snapshot["events"].items():
+            lines.append(f'scraper_events_total{{event="{event}"}} {count}')
+        for name, value in snapshot["gauges"].items():
+            lines.append(f"# TYPE scraper_{name} gauge")
+            lines.append(f"scraper_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            if path.endswith(".json"):
+                json.dump(self.snapshot(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+
+metrics = Metrics()
@@ -0,0 +1,387 @@
+import cProfile
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("sample", "cprofile", "memory")
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL = 0.005
+TRACEBACK_FRAMES = 25
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 30
+# Growth in traced memory over the last snapshot before another is taken
+SNAPSHOT_GROWTH = 1.1
+RUN_STAGE = "run"
+UNSTAGED = "unstaged"
+
+_active = None
+
+
+def active():
+    return _active
+
+
+class _Stage:
+    __slots__ = ("name", "profiler")
+
+    def __init__(self, name: str, profiler):
+        self.name = name
+        self.profiler = profiler
+
+    def __enter__(self):
+        if self.profiler is not None:
+            self.profiler.enter(self.name)
+
+    def __exit__(self, *exc_info):
+        if self.profiler is not None:
+            self.profiler.exit(self.name)
+        return False
+
+
+def stage(name: str) -> _Stage:
+    return _Stage(name, _active)
+
+
+class Profiler:
+    def __init__(self, output_dir: str = PROFILE_DIR):
+        self.output_dir = output_dir
+        self._stages: dict[int, list[str]] = {}
+
+    def current_stage(self, thread_id: int) -> str:
+        stack = self._stages.get(thread_id)
+        return stack[-1] if stack else UNSTAGED
+
+    def enter(self, name: str):
+        self._stages.setdefault(threading.get_ident(), []).append(name)
+
+    def exit(self, name: str):
+        self._stages[threading.get_ident()].pop()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def write(self) -> list[str]:
+        return []
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.output_dir, name)
+
+    def __enter__(self):
+        global _active
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.start()
+        _active = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        _active = None
+        self.stop()
+        paths = self.write()
+        logger.info(f"Wrote {len(paths)} profile files to {self.output_dir}")
+        return False
+
+
+def frame_label(code) -> str:
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler(Profiler):
+    # Wall-clock samples of every thread's stack, written in the collapsed
+    # format flamegraph.pl, inferno and speedscope read: one file per stage
+    # and all.folded with the stage as the root frame.
+    def __init__(self, output_dir: str = PROFILE_DIR, interval=SAMPLE_INTERVAL):
+        super().__init__(output_dir)
+        self.interval = interval
+        self.samples: dict[str, Counter] = defaultdict(Counter)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._sample, name="profile-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    stacks = self.samples[self.current_stage(thread_id)]
+                    stacks[collapse(frame)] += 1
+
+    def write(self) -> list[str]:
+        paths = [self.path("all.folded")]
+        with open(paths[0], "w") as combined:
+            for name, stacks in sorted(self.samples.items()):
+                paths.append(self.path(f"{name}.folded"))
+                with open(paths[-1], "w") as f:
+                    for stack, count in stacks.most_common():
+                        f.write(f"{stack} {count}\n")
+                        combined.write(f"{name};{stack} {count}\n")
+        return paths
+
+
+class StageProfiler(Profiler):
+    # One cProfile.Profile per thread and stage, switched on stage entry so
+    # nested stages are not counted twice, then merged into a .pstats file
+    # per stage
+    def __init__(self, output_dir: str = PROFILE_DIR):
+        super().__init__(output_dir)
+        self.profiles: dict[str, list[cProfile.Profile]] = defaultdict(list)
+        self._owned: dict[tuple[int, str], cProfile.Profile] = {}
+        self._running: dict[int, list[cProfile.Profile]] = {}
+        self._lock = threading.Lock()
+
+    def _profile(self, thread_id: int, name: str) -> cProfile.Profile:
+        profile = self._owned.get((thread_id, name))
+        if profile is None:
+            profile = self._owned[(thread_id, name)] = cProfile.Profile()
+            with self._lock:
+                self.profiles[name].append(profile)
+        return profile
+
+    def enter(self, name: str):
+        thread_id = threading.get_ident()
+        running = self._running.setdefault(thread_id, [])
+        if running:
+            running[-1].disable()
+        profile = self._profile(thread_id, name)
+        profile.enable()
+        running.append(profile)
+
+    def exit(self, name: str):
+        running = self._running[threading.get_ident()]
+        running.pop().disable()
+        if running:
+            running[-1].enable()
+
+    def start(self):
+        self.enter(RUN_STAGE)
+
+    def stop(self):
+        self.exit(RUN_STAGE)
+
+    def write(self) -> list[str]:
+        paths = []
+        for name, profiles in sorted(self.profiles.items()):
+            profiles = [p for p in profiles if p.getstats()]
+            if not profiles:
+                continue
+            stats = pstats.Stats(*profiles)
+            paths.append(self.path(f"{name}.pstats"))
+            stats.dump_stats(paths[-1])
+            paths.append(self.path(f"{name}.txt"))
+            with open(paths[-1], "w") as f:
+                stats.stream = f
+                stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        return paths
+
+
+def code_key(code) -> tuple:
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def builtin_key(function) -> tuple:
+    name = getattr(function, "__qualname__", None) or repr(function)
+    return "~", 0, f"<built-in method {name}>"
+
+
+class TracingStageProfiler(Profiler):
+    # Python 3.12+ runs cProfile on the process-wide sys.monitoring, so only
+    # one profile can be active at a time and per-thread stage profiles would
+    # shut out every worker. Calls are timed from a setprofile hook on every
+    # thread instead: slower than cProfile, but the .pstats files are the same.
+    def __init__(self, output_dir: str = PROFILE_DIR):
+        super().__init__(output_dir)
+        self._local = threading.local()
+        self._thread_stats: list[dict] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        threading.setprofile_all_threads(self._trace)
+
+    def stop(self):
+        threading.setprofile_all_threads(None)
+
+    def _trace(self, frame, event, arg):
+        now = time.perf_counter()
+        local = self._local
+        stack = getattr(local, "stack", None)
+        if stack is None:
+            stack = local.stack = []
+            local.stats = {}
+            with self._lock:
+                self._thread_stats.append(local.stats)
+
+        if event == "call" or event == "c_call":
+            key = code_key(frame.f_code) if event == "call" else builtin_key(arg)
+            stage = self.current_stage(threading.get_ident())
+            # function, stage, started, time spent in callees
+            stack.append([key, stage, now, 0.0])
+            return
+        if not stack or event not in ("return", "c_return", "c_exception"):
+            return
+
+        key, stage, started, children = stack.pop()
+        elapsed = now - started
+        # primitive calls, calls, own time, cumulative time, callers
+        entry = local.stats.setdefault((stage, key), [0, 0, 0.0, 0.0, {}])
+        recursive = any(outer[0] == key for outer in stack)
+        entry[1] += 1
+        entry[2] += elapsed - children
+        if not recursive:
+            entry[0] += 1
+            entry[3] += elapsed
+        if stack:
+            stack[-1][3] += elapsed
+            caller = entry[4].setdefault(stack[-1][0], [0, 0, 0.0, 0.0])
+            caller[1] += 1
+            caller[2] += elapsed - children
+            if not recursive:
+                caller[0] += 1
+                caller[3] += elapsed
+
+    def write(self) -> list[str]:
+        stages: dict[str, dict] = defaultdict(dict)
+        for thread_stats in self._thread_stats:
+            for (stage, key), (cc, nc, tt, ct, callers) in thread_stats.items():
+                merged = stages[stage].get(key)
+                if merged is None:
+                    merged = stages[stage][key] = [0, 0, 0.0, 0.0, {}]
+                for index, value in enumerate((cc, nc, tt, ct)):
+                    merged[index] += value
+                for caller, counts in callers.items():
+                    totals = merged[4].setdefault(caller, [0, 0, 0.0, 0.0])
+                    for index, value in enumerate(counts):
+                        totals[index] += value
+
+        paths = []
+        for name, functions in sorted(stages.items()):
+            paths.append(self.path(f"{name}.pstats"))
+            with open(paths[-1], "wb") as f:
+                marshal.dump(
+                    {
+                        key: (
+                            cc,
+                            nc,
+                            tt,
+                            ct,
+                            {caller: tuple(v) for caller, v in callers.items()},
+                        )
+                        for key, (cc, nc, tt, ct, callers) in functions.items()
+                    },
+                    f,
+                )
+            paths.append(self.path(f"{name}.txt"))
+            with open(paths[-1], "w") as f:
+                stats = pstats.Stats(paths[-2], stream=f)
+                stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        return paths
+
+
+class AllocationProfiler(Profiler):
+    # A snapshot taken only at exit misses anything freed before then, such
+    # as each exported chunk, so another is taken whenever a stage ends with
+    # traced memory at a new high
+    def __init__(self, output_dir: str = PROFILE_DIR):
+        super().__init__(output_dir)
+        self.snapshot: tracemalloc.Snapshot | None = None
+        self.high_snapshot: tracemalloc.Snapshot | None = None
+        self.high = 0
+        self.high_stage: str | None = None
+        self.stage_highs: dict[str, int] = defaultdict(int)
+        self.current = self.peak = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        tracemalloc.start(TRACEBACK_FRAMES)
+
+    def exit(self, name: str):
+        super().exit(name)
+        current = tracemalloc.get_traced_memory()[0]
+        with self._lock:
+            self.stage_highs[name] = max(self.stage_highs[name], current)
+            if current > self.high * SNAPSHOT_GROWTH:
+                self.high, self.high_stage = current, name
+                self.high_snapshot = self.take_snapshot()
+
+    def take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            ]
+        )
+
+    def stop(self):
+        self.snapshot = self.take_snapshot()
+        self.current, self.peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    def write(self) -> list[str]:
+        path = self.path("memory.txt")
+        with open(path, "w") as f:
+            f.write(f"Traced memory: current {self.current / 2**20:.1f} MiB, ")
+            f.write(f"peak {self.peak / 2**20:.1f} MiB\n\n")
+            f.write("Highest traced memory when each stage ended:\n")
+            for name, size in sorted(self.stage_highs.items(), key=lambda s: -s[1]):
+                f.write(f"{name}: {size / 2**20:.1f} MiB\n")
+
+            snapshot, title = self.snapshot, "still live at exit"
+            if self.high_snapshot is not None and self.high > self.current:
+                snapshot = self.high_snapshot
+                title = (
+                    f"live at the high-water mark "
+                    f"({self.high / 2**20:.1f} MiB, after {self.high_stage})"
+                )
+            f.write(f"\nTop {TOP_ALLOCATIONS} allocation sites {title}:\n")
+            for entry in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                f.write(f"{entry}\n")
+            f.write("\nLargest allocation tracebacks:\n")
+            for entry in snapshot.statistics("traceback")[:10]:
+                f.write(f"\n{entry.count} blocks, {entry.size / 1024:.1f} KiB\n")
+                for line in entry.traceback.format(limit=8):
+                    f.write(f"{line}\n")
+        return [path]
+
+
+PROFILERS = {
+    "sample": SamplingProfiler,
+    "cprofile": StageProfiler if sys.version_info < (3, 12) else TracingStageProfiler,
+    "memory": AllocationProfiler,
+}
+
+
+def profile(mode: str | None, output_dir: str = PROFILE_DIR):
+    if mode is None:
+        return nullcontext()
+    return PROFILERS[mode](output_dir)
@@ -0,0 +1,218 @@
+import argparse
+import logging
+import time
+
+from sqlalchemy import Integer, and_, case, cast, func, or_, update
+
+import che_stats
+from student import Session, Student, StudentRaw
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+ACADEMIC_YEAR = "2023/2024"
+
+FACULTIES = {
+    "FAID": "Faculty of Architecture and the Built Environment",
+    "FBS": "Faculty of Business and Globalization",
+    "FCM": "Faculty of Communication, Media and Broadcasting",
+    "FCO": "Faculty of Communication, Media and Broadcasting",
+    "FCTH": "Faculty of Creativity in Tourism & Hospitality",
+    "FDSI": "Faculty of Design and Innovation",
+    "FFLD": "Faculty of Design and Innovation",
+    "FFTB": "Faculty of Communication, Media and Broadcasting",
+    "FINT": "Faculty of Information & Communication Technology",
+    "FMS": "Faculty of Communication, Media and Broadcasting",
+}
+UNKNOWN_FACULTY = "Unknown"
+
+# Checked in order against the lower-cased programme name; the first rule with
+# a matching keyword gives (duration in years, qualification code).
+PROGRAM_RULES = [
+    (("diploma", "associate"), 3, 1),
+    (("certificate",), 1, 2),
+]
+DEFAULT_DURATION = 4
+DEFAULT_QUALIFICATION = 3
+
+# (qualification, year of study) -> tuition fee
+TUITION_FEES = {
+    (1, 1): 12000,
+    (2, 1): 19475,
+    (2, 2): 19988,
+    (3, 1): 19988,
+}
+DEFAULT_TUITION_FEE = 25625
+
+MARK_PER_CGPA_POINT = 25
+NO_RESULTS_MARK = 999
+PASS_MARK = 50
+GOVERNMENT_SPONSORS = ("NMDS",)
+UNKNOWN_SPONSOR = "Unknown"
+
+
+def get_faculty_or_school(code):
+    return FACULTIES.get(code, UNKNOWN_FACULTY)
+
+
+def get_program_rule(program: str):
+    for keywords, duration, qualification in PROGRAM_RULES:
+        if any(keyword in program.lower() for keyword in keywords):
+            return duration, qualification
+    return DEFAULT_DURATION, DEFAULT_QUALIFICATION
+
+
+def get_duration_of_program(program: str):
+    return get_program_rule(program)[0]
+
+
+def get_qualification(program: str):
+    return get_program_rule(program)[1]
+
+
+def get_student_status(program: str, year_of_study: int):
+    program_duration = get_duration_of_program(program)
+    return "Completer" if year_of_study == program_duration else "Continuing Student"
+
+
+def get_tuition_fee(qualification: int, year_of_study: int):
+    return TUITION_FEES.get((qualification, year_of_study), DEFAULT_TUITION_FEE)
+
+
+def parse_cgpa(cgpa) -> float | None:
+    try:
+        return float(cgpa)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_overall_exam_mark(cgpa_value: float | None):
+    if cgpa_value is None:
+        return None
+    if cgpa_value < 0:
+        return NO_RESULTS_MARK
+    return int(cgpa_value * MARK_PER_CGPA_POINT)
+
+
+def get_graduate_status(overall_exam_mark):
+    if overall_exam_mark and overall_exam_mark >= PASS_MARK:
+        return "Passed"
+    return "Failed"
+
+
+def get_sponsor_type(asst_provider):
+    return "Government" if asst_provider in GOVERNMENT_SPONSORS else "Other"
+
+
+def derive_student(raw: dict) -> dict:
+    names = raw["name"].split()
+    program = raw["program"]
+    year_of_study = raw["year_of_study"]
+    qualification = get_qualification(program)
+    overall_exam_mark = get_overall_exam_mark(raw["cgpa_value"])
+    return dict(
+        student_number=raw["student_number"],
+        academic_year=ACADEMIC_YEAR,
+        first_name=" ".join(names[:-1]),
+        surname=names[-1],
+        date_of_birth=raw["birthdate"],
+        gender=raw["sex"],
+        nationality=raw["nationality"] or "Unknown",
+        faculty_or_school=get_faculty_or_school(raw["school"]),
+        program=program,
+        duration_on_program=get_duration_of_program(program),
+        year_of_study=year_of_study,
+        qualification=qualification,
+        student_status=get_student_status(program, year_of_study),
+        overall_exam_mark=overall_exam_mark,
+        graduate_status=get_graduate_status(overall_exam_mark),
+        fees_tuition=get_tuition_fee(qualification, year_of_study),
+        type_of_main_sponsor=get_sponsor_type(raw["asst_provider"]),
+        name_of_main_sponsor=raw["asst_provider"] or UNKNOWN_SPONSOR,
+    )
+
+
+def program_rule_expression(program, index: int, default):
+    program = func.lower(program)
+    return case(
+        *(
+            (or_(*(program.contains(keyword) for keyword in rule[0])), rule[index])
+            for rule in PROGRAM_RULES
+        ),
+        else_=default,
+    )
+
+
+def derived_columns() -> dict:
+    raw = StudentRaw
+    duration = program_rule_expression(raw.program, 1, DEFAULT_DURATION)
+    qualification = program_rule_expression(raw.program, 2, DEFAULT_QUALIFICATION)
+    overall_exam_mark = case(
+        (raw.cgpa_value.is_(None), None),
+        (raw.cgpa_value < 0, NO_RESULTS_MARK),
+        else_=cast(func.floor(raw.cgpa_value * MARK_PER_CGPA_POINT), Integer),
+    )
+    return {
+        Student.academic_year: ACADEMIC_YEAR,
+        Student.faculty_or_school: case(
+            *((raw.school == code, name) for code, name in FACULTIES.items()),
+            else_=UNKNOWN_FACULTY,
+        ),
+        Student.duration_on_program: duration,
+        Student.qualification: qualification,
+        Student.student_status: case(
+            (raw.year_of_study == duration, "Completer"),
+            else_="Continuing Student",
+        ),
+        Student.overall_exam_mark: overall_exam_mark,
+        Student.graduate_status: case(
+            (overall_exam_mark >= PASS_MARK, "Passed"), else_="Failed"
+        ),
+        Student.fees_tuition: case(
+            *(
+                (and_(qualification == q, raw.year_of_study == year), fee)
+                for (q, year), fee in TUITION_FEES.items()
+            ),
+            else_=DEFAULT_TUITION_FEE,
+        ),
+        Student.type_of_main_sponsor: case(
+            (raw.asst_provider.in_(GOVERNMENT_SPONSORS), "Government"),
+            else_="Other",
+        ),
+        Student.name_of_main_sponsor: case(
+            (
+                or_(raw.asst_provider.is_(None), raw.asst_provider == ""),
+                UNKNOWN_SPONSOR,
+            ),
+            else_=raw.asst_provider,
+        ),
+    }
+
+
+def rederive(session) -> int:
+    result = session.execute(
+        update(Student)
+        .where(Student.student_number == StudentRaw.student_number)
+        .values(derived_columns())
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    che_stats.rebuild(session)
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(
+        description="Recompute derived student columns from the raw scraped fields"
+    ).parse_args()
+    session = Session()
+    try:
+        started = time.perf_counter()
+        updated = rederive(session)
+        logger.info(
+            f"Re-derived {updated} students in {time.perf_counter() - started:.2f}s"
+        )
+    finally:
+        session.close()
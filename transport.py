@@ -0,0 +1,255 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 60
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+LATENCY_WINDOW = 200
+MIN_WINDOW_SAMPLES = 8
+LATENCY_TOLERANCE = 2.0
+MAX_ERROR_RATE = 0.02
+DECREASE_FACTOR = 0.5
+
+
+def mount_adapters(session: requests.Session, pool_size: int):
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def build_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    session.verify = False
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    session.headers["Connection"] = "keep-alive"
+    mount_adapters(session, pool_size)
+    return session
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int | None = None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RetryBudget:
+    # Every request deposits `ratio` of a retry, so retries stay within that
+    # share of traffic once the initial `min_retries` allowance is spent.
+    def __init__(self, ratio: float = 0.1, min_retries: int = 10):
+        self.ratio = ratio
+        self._balance = float(min_retries)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance += self.ratio
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class LatencyWindow:
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float, failed: bool = False):
+        self._samples.append((seconds, failed))
+
+    def recent(self, count: int) -> list[tuple[float, bool]]:
+        return list(self._samples)[-count:]
+
+    def percentile(self, p: float, count: int | None = None) -> float:
+        samples = sorted(s for s, _ in self.recent(count or len(self._samples)))
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+    def error_rate(self, count: int | None = None) -> float:
+        samples = self.recent(count or len(self._samples))
+        return sum(failed for _, failed in samples) / len(samples) if samples else 0.0
+
+
+class AdaptiveLimiter:
+    # AIMD over in-flight requests: after each window of `limit` completions
+    # the limit grows (doubling until the first congestion signal, then by
+    # one) while p95 latency stays within LATENCY_TOLERANCE of the best window
+    # seen and errors stay rare. 5xx responses, timeouts, login bounces and
+    # slow windows halve it, at most once per p95 so one burst of failures
+    # only counts once.
+    def __init__(self, maximum: int, minimum: int = 1, initial: int | None = None):
+        if minimum < 1 or maximum < minimum:
+            raise ValueError("Concurrency limits must satisfy 1 <= minimum <= maximum")
+        self.minimum = minimum
+        self.maximum = maximum
+        self._limit = float(min(maximum, max(minimum, initial or minimum)))
+        self._inflight = 0
+        self._completed = 0
+        self._slow_start = True
+        self._baseline: float | None = None
+        self._last_decrease = 0.0
+        self.window = LatencyWindow()
+        self._cond = threading.Condition()
+        metrics.set_gauge("concurrency_limit", self.limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self):
+        with self._cond:
+            while self._inflight >= self.limit:
+                self._cond.wait()
+            self._inflight += 1
+
+    def release(self, seconds: float, congested: str | None = None):
+        with self._cond:
+            self._inflight -= 1
+            self.window.add(seconds, congested is not None)
+            if congested is not None:
+                self._decrease(congested)
+            else:
+                self._completed += 1
+                if self._completed >= max(self.limit, MIN_WINDOW_SAMPLES):
+                    self._end_window()
+            self._cond.notify_all()
+
+    def congestion(self, reason: str):
+        with self._cond:
+            self._decrease(reason)
+            self._cond.notify_all()
+
+    def _end_window(self):
+        count = self._completed
+        self._completed = 0
+        p95 = self.window.percentile(95, count)
+        if self._baseline is None or p95 < self._baseline:
+            self._baseline = p95
+        if p95 > self._baseline * LATENCY_TOLERANCE:
+            self._decrease(f"p95 {p95 * 1000:.0f}ms")
+        elif self.window.error_rate(count) <= MAX_ERROR_RATE:
+            step = self._limit if self._slow_start else 1
+            self._set_limit(self._limit + step, "healthy window")
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < self.window.percentile(95):
+            return
+        self._last_decrease = now
+        self._slow_start = False
+        self._completed = 0
+        self._set_limit(self._limit * DECREASE_FACTOR, reason)
+
+    def _set_limit(self, limit: float, reason: str):
+        previous = self.limit
+        self._limit = min(self.maximum, max(self.minimum, limit))
+        if self.limit != previous:
+            logger.info(f"Concurrency limit {previous} -> {self.limit} ({reason})")
+            metrics.set_gauge("concurrency_limit", self.limit)
+
+
+class Transport:
+    def __init__(
+        self,
+        session: requests.Session,
+        max_retries: int = MAX_RETRIES,
+        backoff: float = RETRY_BACKOFF,
+        rate_limit: TokenBucket | None = None,
+        budget: RetryBudget | None = None,
+        limiter: AdaptiveLimiter | None = None,
+    ):
+        self.session = session
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limit = rate_limit
+        self.budget = budget or RetryBudget()
+        self.limiter = limiter
+
+    def get(
+        self, url: str, timeout: float = REQUEST_TIMEOUT, allow_redirects: bool = True
+    ) -> Response:
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            if self.rate_limit is not None:
+                self.rate_limit.acquire()
+
+            error = None
+            try:
+                response = self._send(url, timeout, allow_redirects)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                reason = f"status code {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error, reason = None, e, str(e)
+
+            if attempt >= self.max_retries or not self.budget.withdraw():
+                if error is not None:
+                    raise error
+                return response
+
+            delay = self.backoff * 2**attempt * random.uniform(0.5, 1.5)
+            attempt += 1
+            logger.warning(
+                f"Retrying {url} in {delay:.1f}s (attempt {attempt}) after {reason}"
+            )
+            time.sleep(delay)
+
+    def _send(
+        self, url: str, timeout: float, allow_redirects: bool = True
+    ) -> Response:
+        limiter = self.limiter
+        if limiter is None:
+            return self.session.get(
+                url, timeout=timeout, allow_redirects=allow_redirects
+            )
+
+        limiter.acquire()
+        started = time.perf_counter()
+        congested = None
+        try:
+            response = self.session.get(
+                url, timeout=timeout, allow_redirects=allow_redirects
+            )
+            if response.status_code in RETRY_STATUSES:
+                congested = f"status {response.status_code}"
+            return response
+        except (requests.ConnectionError, requests.Timeout) as e:
+            congested = type(e).__name__
+            raise
+        finally:
+            limiter.release(time.perf_counter() - started, congested)
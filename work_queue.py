@@ -0,0 +1,165 @@
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, case, func, or_, select, update
+
+from journal import ERROR, FAILED_OUTCOMES, SAVED
+from student import CrawlTask, Session, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+CLAIM_BATCH = 20
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class WorkQueue:
+    def __init__(
+        self,
+        session_factory=Session,
+        worker: str | None = None,
+        lease: float = LEASE_SECONDS,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self.session_factory = session_factory
+        self.worker = worker or worker_name()
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+    def enqueue(self, students: list[dict]) -> int:
+        if not students:
+            return 0
+        session = self.session_factory()
+        try:
+            result = session.execute(
+                dialect_insert(CrawlTask)
+                .on_conflict_do_nothing()
+                .returning(CrawlTask.student_number),
+                [
+                    dict(
+                        student_number=int(student["student_number"]),
+                        listing=student,
+                        state=PENDING,
+                        attempts=0,
+                    )
+                    for student in students
+                ],
+            )
+            queued = len(result.all())
+            session.commit()
+            return queued
+        finally:
+            session.close()
+
+    def claim(self, limit: int = CLAIM_BATCH) -> list[dict]:
+        now = utcnow()
+        expired = and_(
+            CrawlTask.state == CLAIMED,
+            CrawlTask.claimed_at < now - timedelta(seconds=self.lease),
+        )
+        session = self.session_factory()
+        try:
+            # A worker that died on a task's last attempt would otherwise
+            # leave it claimed for good
+            session.execute(
+                update(CrawlTask)
+                .where(expired, CrawlTask.attempts >= self.max_attempts)
+                .values(state=FAILED, outcome=ERROR)
+                .execution_options(synchronize_session=False)
+            )
+            tasks = session.scalars(
+                select(CrawlTask)
+                .where(
+                    or_(
+                        CrawlTask.state == PENDING,
+                        and_(expired, CrawlTask.attempts < self.max_attempts),
+                    )
+                )
+                .order_by(CrawlTask.student_number)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            ).all()
+            students = []
+            for task in tasks:
+                task.state = CLAIMED
+                task.claimed_by = self.worker
+                task.claimed_at = now
+                task.attempts += 1
+                students.append(task.listing)
+            session.commit()
+            return students
+        finally:
+            session.close()
+
+    def record_outcome(self, student_number: str, outcome: str):
+        if outcome in FAILED_OUTCOMES:
+            state = case(
+                (CrawlTask.attempts >= self.max_attempts, FAILED), else_=PENDING
+            )
+        else:
+            state = DONE
+        session = self.session_factory()
+        try:
+            session.execute(
+                update(CrawlTask)
+                .where(
+                    CrawlTask.student_number == int(student_number),
+                    CrawlTask.claimed_by == self.worker,
+                )
+                .values(state=state, outcome=outcome)
+            )
+            session.commit()
+        finally:
+            session.close()
+
+    def complete(self, session, student_numbers: list[int]):
+        # Runs inside the writer's transaction, so a task is only done once
+        # its student row is committed
+        session.execute(
+            update(CrawlTask)
+            .where(
+                CrawlTask.student_number.in_(student_numbers),
+                CrawlTask.claimed_by == self.worker,
+            )
+            .values(state=DONE, outcome=SAVED)
+            .execution_options(synchronize_session=False)
+        )
+
+    def release(self) -> int:
+        session = self.session_factory()
+        try:
+            result = session.execute(
+                update(CrawlTask)
+                .where(
+                    CrawlTask.state == CLAIMED, CrawlTask.claimed_by == self.worker
+                )
+                .values(state=PENDING, attempts=CrawlTask.attempts - 1)
+            )
+            session.commit()
+            return result.rowcount
+        finally:
+            session.close()
+
+    def counts(self) -> dict[str, int]:
+        session = self.session_factory()
+        try:
+            rows = session.execute(
+                select(CrawlTask.state, func.count()).group_by(CrawlTask.state)
+            )
+            return dict(rows.all())
+        finally:
+            session.close()
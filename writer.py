@@ -0,0 +1,213 @@
+import hashlib
+import json
+import logging
+import threading
+from datetime import timedelta
+
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.exc import SQLAlchemyError
+
+import che_stats
+from journal import ERROR, SAVED
+from metrics import metrics
+from student import Session, Student, StudentRaw, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def fingerprint(*values) -> str:
+    return hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()
+
+
+def upsert(model, rows: list[dict], **extra):
+    statement = dialect_insert(model)
+    columns = {key for row in rows for key in row} - {"student_number"}
+    return statement.on_conflict_do_update(
+        index_elements=[model.student_number],
+        set_={
+            **{column: statement.excluded[column] for column in columns},
+            **extra,
+        },
+    )
+
+
+class StudentWriter:
+    def __init__(
+        self,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        session_factory=Session,
+        refresh: bool = False,
+        max_age: timedelta | None = None,
+        summaries: bool = True,
+        journal=None,
+        work_queue=None,
+    ):
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self.refresh = refresh
+        self.max_age = max_age
+        self.summaries = summaries
+        self.journal = journal
+        self.work_queue = work_queue
+        self.saved = 0
+        self.failed = 0
+        self._known: set[int] = set()
+        # student number -> (listing fingerprint, details fingerprint, fresh)
+        self._fingerprints: dict[int, tuple[str | None, str | None, bool]] = {}
+        self._pending: list[tuple[dict, dict | None]] = []
+        self._lock = threading.Lock()
+
+    def load_existing(self):
+        session = self.session_factory()
+        try:
+            known = set(session.execute(select(Student.student_number)).scalars())
+            fingerprints = self._load_fingerprints(session) if self.refresh else {}
+            if self.summaries:
+                che_stats.ensure_built(session)
+        finally:
+            session.close()
+        with self._lock:
+            self._known = known
+            self._fingerprints = fingerprints
+        logger.info(f"Loaded {len(known)} existing student numbers")
+        if self.refresh:
+            fresh = sum(entry[2] for entry in fingerprints.values())
+            logger.info(f"{fresh} of {len(fingerprints)} scraped students are fresh")
+
+    def _load_fingerprints(self, session) -> dict:
+        fresh = literal(True)
+        if self.max_age is not None:
+            now = session.execute(select(func.now())).scalar()
+            fresh = StudentRaw.scraped_at >= now - self.max_age
+        rows = session.execute(
+            select(
+                StudentRaw.student_number,
+                StudentRaw.listing_fingerprint,
+                StudentRaw.details_fingerprint,
+                fresh,
+            )
+        )
+        return {
+            student_number: (listing, details, bool(is_fresh))
+            for student_number, listing, details, is_fresh in rows
+        }
+
+    def exists(self, student_number) -> bool:
+        return int(student_number) in self._known
+
+    def is_fresh(self, student_number, listing_fingerprint: str) -> bool:
+        entry = self._fingerprints.get(int(student_number))
+        return entry is not None and entry[2] and entry[0] == listing_fingerprint
+
+    def add(self, row: dict, raw: dict | None = None):
+        batch = None
+        if self.refresh and raw is not None:
+            entry = self._fingerprints.get(row["student_number"])
+            if entry is not None and entry[1] == raw.get("details_fingerprint"):
+                metrics.increment("students_unchanged")
+        with self._lock:
+            self._known.add(row["student_number"])
+            self._pending.append((row, raw))
+            if len(self._pending) >= self.batch_size:
+                batch, self._pending = self._pending, []
+        if batch:
+            self._write(batch)
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._write(batch)
+
+    def rebuild_summaries(self):
+        # Upserts can change rows already counted, so refreshed runs recompute
+        # the summaries instead of applying deltas
+        if not (self.summaries and self.refresh and self.saved):
+            return
+        session = self.session_factory()
+        try:
+            with metrics.timed("summary_rebuild"):
+                rows = che_stats.rebuild(session)
+            logger.info(f"Rebuilt {rows} student summary rows")
+        finally:
+            session.close()
+
+    def _insert(self, session, batch: list[tuple[dict, dict | None]]):
+        rows = [row for row, _ in batch]
+        raws = [raw for _, raw in batch if raw is not None]
+        with metrics.timed("db_write"):
+            if self.refresh:
+                session.execute(upsert(Student, rows), rows)
+            else:
+                session.execute(insert(Student), rows)
+                if self.summaries:
+                    che_stats.apply_deltas(session, rows)
+            # student_raw is a staging table and can outlive the students rows
+            # it was derived from, so it is always upserted
+            if raws:
+                session.execute(upsert(StudentRaw, raws, scraped_at=func.now()), raws)
+            if self.work_queue is not None:
+                self.work_queue.complete(
+                    session, [row["student_number"] for row in rows]
+                )
+            session.commit()
+
+    def _write(self, batch: list[tuple[dict, dict | None]]):
+        session = self.session_factory()
+        try:
+            try:
+                self._insert(session, batch)
+                self._saved(batch)
+                logger.info(f"Saved {len(batch)} students to the database")
+                return
+            except SQLAlchemyError as e:
+                session.rollback()
+                if len(batch) == 1:
+                    self._reject(batch[0][0], e)
+                    return
+                logger.warning(
+                    f"Bulk insert of {len(batch)} students failed, retrying one by one: {str(e)}"
+                )
+
+            for entry in batch:
+                try:
+                    self._insert(session, [entry])
+                    self._saved([entry])
+                except SQLAlchemyError as e:
+                    session.rollback()
+                    self._reject(entry[0], e)
+        finally:
+            session.close()
+
+    def _record(self, saved: int = 0, failed: int = 0):
+        metrics.increment("rows_written", saved)
+        metrics.increment("rows_failed", failed)
+        with self._lock:
+            self.saved += saved
+            self.failed += failed
+
+    def _saved(self, batch: list[tuple[dict, dict | None]]):
+        # Outcomes are only journaled once committed, so buffered students
+        # lost in a crash are still pending and get listed again on resume
+        self._record(saved=len(batch))
+        if self.journal is not None:
+            self.journal.record_outcomes(
+                [str(row["student_number"]) for row, _ in batch], SAVED
+            )
+
+    def _reject(self, row: dict, error: Exception):
+        student_number = row["student_number"]
+        logger.error(
+            f"Error saving student {student_number} to database: {str(error)}"
+        )
+        self._record(failed=1)
+        with self._lock:
+            self._known.discard(student_number)
+        if self.journal is not None:
+            self.journal.record_outcome(str(student_number), ERROR)
+        if self.work_queue is not None:
+            self.work_queue.record_outcome(student_number, ERROR)